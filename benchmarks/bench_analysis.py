@@ -0,0 +1,96 @@
+"""
+Benchmark of the post-conversation analysis: LLM and embedding calls per conversation of
+the previous GenerativeAgent pipeline (memory with importance scoring and reflections,
+then a demo check and a summary) against the single-call ConversationAnalysisChain.
+
+Usage: python benchmarks/bench_analysis.py [turns] [llm_latency]
+"""
+import os
+import sys
+import time
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+warnings.filterwarnings('ignore')
+import faiss
+from langchain.chains import LLMChain
+from langchain.chains.summarize import load_summarize_chain
+from langchain.prompts import PromptTemplate
+from langchain.retrievers import TimeWeightedVectorStoreRetriever
+from langchain_community.docstore import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_experimental.generative_agents.generative_agent import GenerativeAgent
+from langchain_experimental.generative_agents.memory import GenerativeAgentMemory
+from conversation_analysis import ConversationAnalysisChain, build_transcript
+from fakes import FakeChatModel, FakeEmbeddings
+from utils import relevance_score_fn
+
+
+def reply(prompt):
+    """Canned answers of the stub LLM to the prompts of both pipelines."""
+    if 'rate the likely poignancy' in prompt:
+        return '8'
+    if 'most salient high-level questions' in prompt:
+        return 'What does the professional need?\nIs the professional interested in a demo?\nWhich products were discussed?'
+    if 'high-level novel insights' in prompt:
+        return 'The professional is interested in auditing automation (because of 1, 3)'
+    if "say only 'YES' or 'NO'" in prompt:
+        return 'YES'
+    if 'Demo: YES if' in prompt:
+        return 'Demo: YES\nSummary: The professional needs faster audits and asked for a demo of auditing automation.'
+    return 'The professional needs faster audits and asked for a demo of auditing automation.'
+
+
+def history(turns):
+    lines = []
+    for i in range(turns):
+        if i % 2 == 0:
+            lines.append(f"Sophia: Question {i} about your accounting workflow? <END_OF_TURN>")
+        else:
+            lines.append(f"My answer {i}: audits take too long, a demo of auditing automation would help. <END_OF_TURN>")
+    return lines
+
+
+def memory_retriever(embeddings):
+    vectorstore = FAISS(embeddings, faiss.IndexFlatL2(embeddings.size), InMemoryDocstore({}), {}, relevance_score_fn=relevance_score_fn)
+    return TimeWeightedVectorStoreRetriever(vectorstore=vectorstore, other_score_keys=["importance"], k=15)
+
+
+def run_previous(llm, embeddings, turns):
+    conversation_history_backup = history(turns)
+    observations = [('Lucas - ' if i % 2 == 0 else 'Professional - ') + h for i, h in enumerate(conversation_history_backup)]
+    memory = GenerativeAgentMemory(llm=llm, memory_retriever=memory_retriever(embeddings), verbose=False, reflection_threshold=9)
+    lucas = GenerativeAgent(name="Lucas", status="Lucas helps to get summary of conversation", llm=llm,
+                            memory=memory, memory_retriever=memory_retriever(embeddings))
+    for observation in observations:
+        lucas.memory.add_memory(observation)
+    docs = lucas.memory.memory_retriever.memory_stream
+    map_prompt = PromptTemplate.from_template("""The following is a set of documents
+        {docs}
+        Based on this list of docs, does professional showed interest in demo, say only 'YES' or 'NO'
+        Helpful Answer:""")
+    demo = LLMChain(llm=llm, prompt=map_prompt).run("\n".join(d.page_content for d in docs)) == 'YES'
+    summary = load_summarize_chain(llm, chain_type="stuff").run(docs)
+    return demo, summary
+
+
+def run_current(llm, embeddings, turns):
+    transcript = build_transcript(history(turns), "Sophia", "Professional")
+    return ConversationAnalysisChain.from_llm(llm, verbose=False).analyze(transcript)
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    print(f"{turns} turn conversation, {latency}s per LLM call")
+    print(f"{'pipeline':<30}{'LLM calls':>10}{'embedding calls':>17}{'embedded texts':>16}{'elapsed':>10}{'demo':>6}")
+    for name, run in [('GenerativeAgent + FAISS', run_previous), ('ConversationAnalysisChain', run_current)]:
+        llm = FakeChatModel(responder=reply, first_token_latency=latency)
+        embeddings = FakeEmbeddings()
+        start = time.perf_counter()
+        demo, _ = run(llm, embeddings, turns)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<30}{llm.calls:>10}{embeddings.calls:>17}{embeddings.texts:>16}{elapsed:>9.2f}s{'YES' if demo else 'NO':>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of the demo link handout against a local stub of the Calendly API: latency of
+creating a link when the professional asks for it, as before, against taking one from the
+pre-provisioned link pool, and the retries of a rate-limited and failing API.
+
+Usage: python benchmarks/bench_calendly.py [handouts] [api_latency] [watermark]
+"""
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from calendly import CalendlyClient, CalendlyLinkPool
+from fakes import FakeCalendlyServer
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1e6, latencies[int(len(latencies) * 0.99) - 1] * 1e6
+
+
+def main():
+    handouts = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    watermark = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    server = FakeCalendlyServer(latency=latency).start()
+    client = CalendlyClient(api_key='fake', event_uuid='fake', base_url=server.url)
+    print(f"{handouts} demo links, {latency}s per Calendly request, watermark {watermark}")
+    print(f"{'handout':<26}{'p50':>12}{'p99':>12}")
+
+    direct = []
+    for _ in range(handouts):
+        start = time.perf_counter()
+        client.create_link()
+        direct.append(time.perf_counter() - start)
+    print(f"{'created on demand':<26}{percentiles(direct)[0]:>10.0f}us{percentiles(direct)[1]:>10.0f}us")
+
+    pool = CalendlyLinkPool(client, watermark=watermark, path='').start()
+    while len(pool.links) < watermark:
+        time.sleep(0.01)
+    pooled = []
+    for _ in range(handouts):
+        # Demo requests arrive a few seconds apart in a campaign, leaving time for the refill.
+        time.sleep(latency / 4)
+        start = time.perf_counter()
+        pool.get()
+        pooled.append(time.perf_counter() - start)
+    pool.stop()
+    print(f"{'from the pool':<26}{percentiles(pooled)[0]:>10.0f}us{percentiles(pooled)[1]:>10.0f}us")
+    print(f"pool: {pool.stats()}")
+    server.stop()
+
+    server = FakeCalendlyServer(errors=[429, 500], retry_after=0.1).start()
+    client = CalendlyClient(api_key='fake', event_uuid='fake', base_url=server.url)
+    start = time.perf_counter()
+    link = client.create_link()
+    print(f"429, 500 then 201: {link} after {server.requests} requests in {time.perf_counter() - start:.2f}s")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
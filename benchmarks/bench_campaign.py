@@ -0,0 +1,158 @@
+"""
+Offline load test of the whole campaign loop: roster loading, Slack events, the agent's
+chains, the post-conversation analysis and the demo links, against in-process fakes of
+Slack (with scripted professionals answering the agent), Azure OpenAI (a chat model with
+configurable latency streaming its replies) and Calendly. It reports conversations per
+hour, the p50/p99 latency of the turns seen by the professionals and the LLM calls per
+conversation, and exits with status 1 when the p99 turn latency exceeds max_p99_ms.
+
+Usage: python benchmarks/bench_campaign.py [professionals] [llm_latency] [think_time] [max_p99_ms]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+TMP = tempfile.mkdtemp(prefix='bench_campaign_')
+# Set before the application modules read their configuration.
+os.environ.update({
+    # Every file written at runtime goes to the temporary directory, not the working directory.
+    'CACHE_DIR': TMP,
+    'STATE_STORE_PATH': os.path.join(TMP, 'conversations.sqlite'),
+    'SLACK_USER_CACHE_PATH': os.path.join(TMP, 'slack_users.json'),
+    'LLM_CACHE_PATH': os.path.join(TMP, 'llm_cache.sqlite'),
+    'EMBEDDING_CACHE_PATH': os.path.join(TMP, 'embedding_cache.f32'),
+    'STAGE_CLASSIFIER_MODEL_PATH': os.path.join(TMP, 'stage_classifier.npz'),
+    'STAGE_CLASSIFIER_LOG_PATH': '',
+    'MEMORY_STORE_PATH': '',
+    'METRICS_JSONL_PATH': '',
+    'METRICS_PROMETHEUS_PATH': '',
+    'CALENDLY_API_KEY': 'fake-key',
+    'CALENDLY_EVENT_UUID': 'fake-event',
+    'CALENDLY_POOL_PATH': '',
+    'SLACK_STREAM_UPDATE_INTERVAL': '0.05',
+    'SUMMARY_CHANNEL_ID': '',
+    # Professionals who never answer are given up after 3 seconds instead of 15 minutes.
+    'CONVERSATION_NO_RESPONSE_TIMEOUT': '0.05',
+    'CONVERSATION_IDLE_TIMEOUT': '0.5',
+})
+import warnings
+warnings.filterwarnings('ignore')
+import numpy as np
+import pandas as pd
+from calendly import get_link_pool
+from campaign import Campaign
+from config import Config
+from fakes import FakeSlackClient, FakeChatModel, FakeCalendlyServer, ProfessionalSimulator
+from instrumentation import get_instrumentation
+from llm_executor import get_llm_executor
+from roster import Roster, ROSTER_GROUP_COLUMNS, ROSTER_LIST_COLUMNS
+from slack_events import SlackEventRouter, SlackEventListener
+
+# Lines of the scripted professionals, the last one ends the conversation.
+SCRIPTS = {
+    'demo': ["Hi Sophia, sure, tell me more.",
+             "Month-end close takes us a lot of time.",
+             "Compliance checks are our main pain point.",
+             "That sounds useful, I would like to book a demo of the compliance automation.",
+             "Thanks, goodbye."],
+    'curious': ["Hello, what is this about?",
+                "We already use other tools for the audits.",
+                "I will look at the training later, goodbye."],
+    'not_interested': ["Sorry, I am not interested, goodbye."],
+    'busy': [],
+}
+# Share of the professionals following every script.
+SCRIPT_WEIGHTS = {'demo': 0.4, 'curious': 0.3, 'not_interested': 0.15, 'busy': 0.15}
+
+AGENT_MESSAGE = ("Sophia: Thanks for your answer. Our new automation products save accountants hours every week, "
+                 "and the training only takes an afternoon. Which part of your work takes you the most time? <END_OF_TURN>")
+
+
+def scripted_llm_reply(prompt):
+    """Answers the prompts of the agent's chains the way the deployed model would, from the conversation so far."""
+    ended = 'goodbye' in prompt.lower()
+    if prompt.startswith('Progressively summarize'):
+        return "The professional talked about their work and the products."
+    if 'Demo: YES if' in prompt:
+        demo = 'book a demo' in prompt
+        return f"Demo: {'YES' if demo else 'NO'}\nSummary: The professional discussed the new products."
+    if 'Only answer with a number' in prompt:
+        return '8' if ended else '4'
+    if 'Stage: <one number' in prompt:
+        return "Stage: 8" if ended else "Stage: 4\n" + AGENT_MESSAGE
+    return AGENT_MESSAGE
+
+
+def generate_dataset(path, professionals):
+    """Writes a roster CSV with two training rows per professional."""
+    rows = []
+    for i in range(professionals):
+        email = f"professional{i}@example.com"
+        for training in ("Training 1", "Training 2"):
+            rows.append([email, f"First{i}", f"Last{i}", email, training, "AUDITING AUTOMATION", "COMPLIANCE AUTOMATION",
+                         "feedback", training, "Training 3", "Training 4"])
+    pd.DataFrame(rows, columns=ROSTER_GROUP_COLUMNS + ROSTER_LIST_COLUMNS).to_csv(path, index=False)
+
+
+def main():
+    professionals = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    llm_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    think_time = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+    max_p99_ms = float(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    path = os.path.join(TMP, 'dataset.csv')
+    generate_dataset(path, professionals)
+    records, _ = Roster.load(path, parquet_cache='').select()
+
+    client = FakeSlackClient()
+    rng = random.Random(0)
+    scripts = {}
+    for record in records:
+        user_id = client.add_user(record['EMAIL'])
+        scripts[user_id] = SCRIPTS[rng.choices(list(SCRIPT_WEIGHTS), weights=list(SCRIPT_WEIGHTS.values()))[0]]
+    router = SlackEventRouter()
+    listener = SlackEventListener(router, signing_secret='', port=0, allow_unsigned=True).start()
+    client.events_url = listener.url
+    simulator = ProfessionalSimulator(client, lambda user_id: scripts[user_id], think_time=think_time).start()
+    calendly = FakeCalendlyServer(latency=0.2).start()
+    Config.CALENDLY_API_URL = calendly.url
+
+    # First token after llm_latency, then about 60 tokens per second like the deployment.
+    model = FakeChatModel(responder=scripted_llm_reply, first_token_latency=llm_latency, token_latency=0.015)
+    llm = get_llm_executor().wrap(model)
+    campaign = Campaign(client, llm, llm, router=router, poll_interval=0.05)
+    print(f"{professionals} professionals, {llm_latency * 1000:.0f}ms to the first token, {think_time}s think time")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        states = asyncio.run(campaign.run(records))
+    elapsed = time.perf_counter() - start
+    simulator.stop()
+    listener.stop()
+    calendly.stop()
+
+    statuses = {}
+    for state in states:
+        statuses[state.status] = statuses.get(state.status, 0) + 1
+    latencies = np.array(simulator.turn_latencies) * 1000
+    p50, p99 = (np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'), float('nan')))
+    print(f"conversations         {len(states):>8} ({', '.join(f'{n} {s}' for s, n in sorted(statuses.items()))}) in {elapsed:.1f}s")
+    print(f"conversations/hour    {len(states) / elapsed * 3600:>8.0f}")
+    print(f"turns                 {len(latencies):>8}, p50 {p50:.0f}ms, p99 {p99:.0f}ms")
+    print(f"LLM calls/conversation{model.calls / len(states):>8.2f}")
+    links = get_link_pool().stats()
+    print(f"demo links            {links['handed_out'] + links['misses']:>8} ({links['misses']} created on demand)")
+    for kind, name, calls, mean, total in get_instrumentation().summary()[:6]:
+        print(f"  {kind} {name:<28}{calls:>6} calls {mean * 1000:>8.1f}ms mean")
+    if max_p99_ms is not None and not p99 <= max_p99_ms:
+        print(f"p99 turn latency above {max_p99_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
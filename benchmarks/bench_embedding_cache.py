@@ -0,0 +1,77 @@
+"""
+Benchmark of the embedding cache: embedding requests, embedded texts and elapsed time of
+campaigns whose transcripts repeat greetings and bot boilerplate, without the cache, with
+the in-memory cache kept by one process, and with the file-backed cache reloaded by a new
+process for every campaign.
+
+Usage: python benchmarks/bench_embedding_cache.py [conversations] [campaigns] [latency]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from embedding_cache import EmbeddingCache, with_embedding_cache
+from fakes import FakeEmbeddings
+
+BOILERPLATE = [
+    "Sophia - Hello, I am Sophia from the R&D team. Do you have a few minutes to talk about our new products?",
+    "Sophia - Thank you for your time, have a great day!",
+    "Sophia - Below is the meeting link for demo",
+    "Professional - Hi Sophia, sure.",
+    "Professional - Thanks, bye.",
+]
+
+
+def transcripts(conversations, rng):
+    """Turns of a campaign: boilerplate lines mixed with answers specific to each professional."""
+    for i in range(conversations):
+        lines = BOILERPLATE[:1] + BOILERPLATE[3:4]
+        for turn in range(8):
+            lines.append(f"Professional - Answer {turn} of professional {i}: {rng.choice(['audits', 'payroll', 'taxes'])} take too long.")
+            lines.append(rng.choice(BOILERPLATE[:3]))
+        lines.extend(BOILERPLATE[1:2] + BOILERPLATE[4:])
+        yield lines
+
+
+def run(name, conversations, campaigns, latency, make_cache):
+    """Runs the campaigns, each one in a new process when make_cache is called for every campaign."""
+    model = FakeEmbeddings(size=256, latency=latency)
+    cache = None
+    hits = misses = 0
+    start = time.perf_counter()
+    for campaign in range(campaigns):
+        if cache is None or name.startswith('file'):
+            if cache is not None:
+                hits, misses = hits + cache.hits, misses + cache.misses
+            cache = make_cache()
+        embeddings = model if cache is None else with_embedding_cache(model, 'bench/256', cache)
+        # Later campaigns contact the same professionals again, who answer alike every other campaign.
+        for lines in transcripts(conversations, random.Random(campaign % 2)):
+            embeddings.embed_documents(lines)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        hits, misses = hits + cache.hits, misses + cache.misses
+    hit_rate = f"{hits / (hits + misses):.0%}" if cache is not None else '-'
+    print(f"{name:<22}{model.calls:>10}{model.texts:>16}{hit_rate:>10}{elapsed:>9.2f}s")
+
+
+def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    campaigns = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    path = os.path.join(tempfile.mkdtemp(), 'embeddings.f32')
+    print(f"{campaigns} campaigns of {conversations} conversations, {latency}s per embedding request")
+    print(f"{'cache':<22}{'requests':>10}{'embedded texts':>16}{'hit rate':>10}{'elapsed':>10}")
+    try:
+        run('none', conversations, campaigns, latency, lambda: None)
+        run('memory, one process', conversations, campaigns, latency, lambda: EmbeddingCache(dimension=256))
+        run('file, one per campaign', conversations, campaigns, latency, lambda: EmbeddingCache(path=path, dimension=256))
+    finally:
+        shutil.rmtree(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmark of the async LLM executor against a local fake chat-completions server: a burst
+of concurrent requests, part of them identical, sent through AzureChatOpenAI directly and
+through the executor (in-flight limit and request coalescing).
+
+Usage: python benchmarks/bench_llm_executor.py [requests] [distinct_prompts] [max_in_flight]
+"""
+import asyncio
+import os
+import sys
+import time
+import warnings
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+warnings.filterwarnings('ignore')
+from langchain_community.chat_models import AzureChatOpenAI
+from fakes import FakeChatCompletionsServer
+from llm_executor import LLMExecutor
+
+
+async def burst(llm, prompts):
+    start = time.perf_counter()
+    await asyncio.gather(*(llm.ainvoke(p) for p in prompts))
+    return time.perf_counter() - start
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    max_in_flight = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    prompts = [f"Which stage follows turn {i % distinct}?" for i in range(requests)]
+    print(f"{requests} concurrent requests, {distinct} distinct prompts, 0.5s server latency")
+    print(f"{'client':<34}{'elapsed':>10}{'server requests':>17}{'max in flight':>15}")
+    for name, wrap in [('AzureChatOpenAI', lambda llm: llm),
+                       (f'executor ({max_in_flight} in flight)', lambda llm: LLMExecutor(max_in_flight=max_in_flight, tokens_per_minute=0).wrap(llm))]:
+        server = FakeChatCompletionsServer(responses=['4'], latency=0.5).start()
+        llm = AzureChatOpenAI(azure_endpoint=server.url, openai_api_key='fake', openai_api_version='2024-02-01',
+                              azure_deployment='fake', temperature=0, max_retries=0)
+        elapsed = asyncio.run(burst(wrap(llm), prompts))
+        print(f"{name:<34}{elapsed:>9.2f}s{server.requests:>17}{server.max_in_flight:>15}")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the persistent memory store with random embeddings: add throughput, latency
+of unfiltered and per-professional searches, and save/memory-mapped load time, for every
+index type at the given sizes.
+
+Usage: python benchmarks/bench_memory_store.py [sizes] [dimension] [index_types]
+       e.g. python benchmarks/bench_memory_store.py 10000,1000000 128 flat,ivf,hnsw
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import numpy as np
+from fakes import FakeEmbeddings
+from memory_store import MemoryStore
+
+PROFESSIONALS = 1000
+CHUNK = 10000
+QUERIES = 200
+
+
+def random_vectors(rng, n, dimension):
+    vectors = rng.standard_normal((n, dimension), dtype='float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def search_latency(store, queries, professional=None):
+    """Returns the median and p99 latency of searches, in milliseconds."""
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        store.search_by_vector(query, k=10, professional=None if professional is None else f"p{i % PROFESSIONALS}@example.com")
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def run(size, dimension, index_type, rng):
+    path = tempfile.mkdtemp()
+    try:
+        # The approximate index is built once half of the vectors are added, the rest are incremental adds.
+        store = MemoryStore(FakeEmbeddings(dimension), path, index_type=index_type, ann_threshold=size // 2,
+                            dimension=dimension)
+        start = time.perf_counter()
+        for offset in range(0, size, CHUNK):
+            n = min(CHUNK, size - offset)
+            # Chunks are spread over professionals so that each one has memories throughout the store.
+            for p in range(min(PROFESSIONALS, n)):
+                ids = range(p, n, PROFESSIONALS)
+                store.add_embeddings(random_vectors(rng, len(ids), dimension), [f"memory {offset + i}" for i in ids],
+                                     professional=f"p{p}@example.com")
+        add = time.perf_counter() - start
+        queries = random_vectors(rng, QUERIES, dimension)
+        unfiltered = search_latency(store, queries)
+        filtered = search_latency(store, queries, professional=True)
+        start = time.perf_counter()
+        store.save()
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = MemoryStore(FakeEmbeddings(dimension), path)
+        load = time.perf_counter() - start
+        assert len(loaded) == size
+        print(f"{size:>9}{index_type:>7}{size / add:>12.0f}/s{unfiltered[0]:>9.2f}{unfiltered[1]:>9.2f}"
+              f"{filtered[0]:>9.2f}{filtered[1]:>9.2f}{save:>8.2f}s{load:>8.2f}s")
+    finally:
+        shutil.rmtree(path)
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 1000000]
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    index_types = sys.argv[3].split(',') if len(sys.argv) > 3 else ['flat', 'ivf', 'hnsw']
+    rng = np.random.default_rng(0)
+    print(f"{dimension}-dimension random embeddings, {PROFESSIONALS} professionals, k=10, latencies in ms")
+    print(f"{'vectors':>9}{'index':>7}{'adds':>14}{'p50':>9}{'p99':>9}{'filt p50':>9}{'filt p99':>9}{'save':>9}{'load':>9}")
+    for size in sizes:
+        for index_type in index_types:
+            run(size, dimension, index_type, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of the Slack text normalizer against the chain of str.replace
+calls previously run on every message in main().
+
+Usage: python benchmarks/bench_normalizer.py [iterations]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import emoji
+from normalizer import normalize_slack_text
+
+SAMPLE_MESSAGES = [
+    "Hi Sophia :wave: thanks for reaching out!",
+    "Sure :+1::skin-tone-2: I'd love a demo of AUDITING AUTOMATION :tada:",
+    "I'm busy right now, ping me tomorrow :sweat_smile:",
+    "Q&amp;A: see <https://aimakerspace.io/|aimakerspace> :bulb:",
+    "Not interested, thanks.",
+    ":smile: :smiley: :grinning: :hugging_face: :mortar_board: :female-student:",
+    "The training was great, finished :one: and :two: already :raised_hands:",
+    "Working on the wavelength of smiles with <@U024BE7LH> :point_right: :mag_right:",
+]
+
+
+def legacy_clean_message_text(text):
+    """The cleaning block previously inlined in main(), kept for comparison."""
+    text = text.replace("blush","smiling_face_with_smiling_eyes")
+    text = text.replace("wave","waving_hand")
+    text = text.replace("+1","thumbs_up")
+    text = text.replace("star2","glowing_star")
+    text = text.replace("bulb","light_bulb")
+    text = text.replace("tada","party_popper")
+    text = text.replace("smile","grinning_face_with_smiling_eyes")
+    text = text.replace("point_right","backhand_index_pointing_right")
+    text = text.replace("raised_hands","raising_hands")
+    text = text.replace("female-technologist","woman_technologist")
+    text = text.replace("male-technologist","man_technologist")
+    text = text.replace("hugging_face","smiling_face_with_open_hands")
+    text = text.replace("grinning_face_with_smiling_eyesy","grinning_face_with_big_eyes")
+    text = text.replace("sweat_grinning_face_with_smiling_eyes","grinning_face_with_sweat")
+    text = text.replace("grinning","grinning_face")
+    text = text.replace("grinning_face_face_with_big_eyes","grinning_face_with_big_eyes")
+    text = text.replace("grinning_face_face_with_sweat","grinning_face_with_sweat")
+    text = text.replace("sweat_smile","grinning_face_with_sweat")
+    text = text.replace(":one:",":keycap_1:")
+    text = text.replace(":two:",":keycap_2:")
+    text = text.replace(":mag_right:",":magnifying_glass_tilted_right:")
+    text = text.replace(":mortar_board:",":graduation_cap:")
+    text = text.replace(":female-student:",":woman_student:")
+    text = text.replace("&amp;","&")
+    text = text.replace("<",'')
+    text = text.replace(">",'')
+    return emoji.emojize(text)
+
+
+def per_message_cost(fn, iterations):
+    """Returns the average cost in microseconds of normalizing one sample message."""
+    def run():
+        for text in SAMPLE_MESSAGES:
+            fn(text)
+    seconds = timeit.timeit(run, number=iterations)
+    return seconds / (iterations * len(SAMPLE_MESSAGES)) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    legacy = per_message_cost(legacy_clean_message_text, iterations)
+    uncached = per_message_cost(normalize_slack_text.__wrapped__, iterations)
+    cached = per_message_cost(normalize_slack_text, iterations)
+    print(f"{'implementation':<28}{'us/message':>12}{'speedup':>10}")
+    for name, cost in [('str.replace chain', legacy), ('single pass (first seen)', uncached), ('single pass (memoized)', cached)]:
+        print(f"{name:<28}{cost:>12.2f}{legacy / cost:>9.1f}x")
+    print()
+    for text in SAMPLE_MESSAGES:
+        old, new = legacy_clean_message_text(text), normalize_slack_text(text)
+        if old != new:
+            print(f"{text!r}\n  chain:       {old!r}\n  single pass: {new!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the roster loading: the previous groupby plus per-email iterrows scan of
+main() against the email-indexed Roster, on a generated CSV.
+
+Usage: python benchmarks/bench_roster.py [professionals] [rows_per_professional] [lookups]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import pandas as pd
+from roster import Roster, ROSTER_GROUP_COLUMNS, ROSTER_LIST_COLUMNS
+
+
+def generate_dataset(path, professionals, rows_per_professional):
+    """Writes a roster CSV with several training rows per professional."""
+    random.seed(0)
+    trainings = [f"Training {i}" for i in range(20)]
+    rows = []
+    for i in range(professionals):
+        email = f"professional{i}@example.com"
+        for _ in range(rows_per_professional):
+            rows.append([email, f"First{i}", f"Last{i}", email, f"Training {i % 5}", f"Product {i % 7}",
+                         f"Training {i % 5}", "Helpful", random.choice(trainings), random.choice(trainings), random.choice(trainings)])
+    random.shuffle(rows)
+    pd.DataFrame(rows, columns=ROSTER_GROUP_COLUMNS + ROSTER_LIST_COLUMNS).to_csv(path, index=False)
+
+
+def legacy_lookup(path, emails):
+    df = pd.read_csv(path)
+    df = df.groupby(ROSTER_GROUP_COLUMNS).aggregate({c: list for c in ROSTER_LIST_COLUMNS}).reset_index()
+    professionals = []
+    for p in emails:
+        professional = None
+        for i, r in df[df['USER_ID'] == p].iterrows():
+            professional = r.to_dict()
+            professional['EMAIL'] = p
+        if professional is not None:
+            professionals.append(professional)
+    return professionals
+
+
+def roster_lookup(path, emails, chunksize):
+    return Roster.load(path, chunksize=chunksize, parquet_cache='').select(emails)[0]
+
+
+def main():
+    professionals = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows_per_professional = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.csv')
+        generate_dataset(path, professionals, rows_per_professional)
+        emails = [f"professional{i}@example.com" for i in random.sample(range(professionals), lookups)]
+        print(f"{professionals} professionals, {professionals * rows_per_professional} rows, {lookups} lookups")
+        results = {}
+        for name, run in [('groupby + iterrows per email', lambda: legacy_lookup(path, emails)),
+                          ('Roster, whole file', lambda: roster_lookup(path, emails, 0)),
+                          ('Roster, 10k row chunks', lambda: roster_lookup(path, emails, 10000))]:
+            start = time.perf_counter()
+            results[name] = run()
+            print(f"{name:<32}{time.perf_counter() - start:>8.2f}s")
+        legacy = {r['EMAIL']: sorted(map(str, r['TRAINING_COMPLETED'])) for r in results['groupby + iterrows per email']}
+        for name, records in results.items():
+            assert {r['EMAIL']: sorted(map(str, r['TRAINING_COMPLETED'])) for r in records} == legacy, name
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark of the local stage classifier against the LLM stage analyzer on replayed turns:
+the logistic model is trained on 80% of the conversations and the other turns are replayed
+through the keyword rules alone, the rules plus the model and the StageAnalyzerChain (with a
+stub model answering after llm_latency). It reports the share of turns decided locally, the
+agreement of the local decisions with the LLM's and, for generated conversations, with the
+stage the template intended, and the cost of a stage decision.
+
+The turns come from the decisions logged in STAGE_CLASSIFIER_LOG_PATH when a log is given,
+otherwise from generated conversations labelled like the LLM analyzer, with some disagreement.
+
+Usage: python benchmarks/bench_stage_classifier.py [conversations] [llm_latency] [threshold] [log_path]
+"""
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import warnings
+warnings.filterwarnings('ignore')
+from conversation import StageAnalyzerChain
+from fakes import FakeChatModel
+from stage_classifier import StageClassifier, LogisticStageModel, load_examples, STAGE_IDS
+
+AGENT_LINES = {
+    '1': "Hi {name}, this is Sophia from the R&D team. Do you have a minute to hear about our new products?",
+    '2': "We are releasing three automation products, with a demo and a training available before June 15th.",
+    '3': "Financial statements automation generates your statements and cuts manual errors.",
+    '4': "What takes you the most time in your day to day work?",
+    '5': "Compliance automation checks your practices against the latest regulations automatically.",
+    '6': "I understand. Many firms using other tools switched because of the time saved on audits.",
+    '7': "Would you be interested in a demo of any of the products?",
+}
+# Replies of the professional with the stage the LLM analyzer picks after them.
+HUMAN_LINES = [
+    ("Sure, go ahead.", '2'), ("Hi Sophia, what is it about?", '2'), ("Ok, tell me more.", '2'),
+    ("What does the auditing tool do exactly?", '3'), ("How is it different from what we have?", '3'),
+    ("Can you explain the financial statements product?", '3'), ("Sure, tell me about the training first.", '3'),
+    ("Not now, but go on about the compliance one.", '3'), ("I'm not interested in the auditing one, what about compliance?", '3'),
+    ("Sounds good, when is the training?", '4'), ("Interesting, go on.", '4'),
+    ("Month-end close takes us days.", '5'), ("We struggle with compliance checks every quarter.", '5'),
+    ("Our audits are slow and full of manual work.", '5'), ("Reconciliations eat most of my week.", '5'),
+    ("I have no time for manual audits anymore.", '5'), ("We don't need a demo yet, what does it cost?", '6'),
+    ("It seems expensive for a small team.", '6'), ("We already use another tool for that.", '6'),
+    ("I am not sure my manager would approve it.", '6'), ("We tried automation before and it failed.", '6'),
+    ("That could help us a lot.", '7'), ("This looks useful for our team.", '7'), ("I like the compliance one.", '7'),
+    ("Sorry, I'm not interested.", '8'), ("I'm busy right now, let's talk later.", '8'), ("Thanks, goodbye!", '8'),
+    ("No thanks, we don't need it.", '8'), ("We are not interested, we already have a tool.", '8'),
+    ("Yes, I would like to book a demo.", '8'), ("Please stop messaging me.", '8'), ("No thanks.", '8'),
+    ("Can we schedule a demo next week?", '8'), ("Have a nice day, bye.", '8'),
+]
+FILLERS = ["", "", "Hmm, ", "Well, ", "Honestly, ", "Ok. ", "Thanks. "]
+
+
+def generate_examples(conversations, seed=0):
+    """Returns the logged decisions of generated conversations, grouped by conversation."""
+    rng = random.Random(seed)
+    grouped = []
+    for i in range(conversations):
+        stage, turns, examples = '1', 2, []
+        for _ in range(rng.randint(1, 6)):
+            agent = AGENT_LINES[stage].format(name=f"Professional{i}")
+            if stage == '7' and rng.random() < 0.5:
+                human, label = rng.choice(["Yes please!", "Sure.", "Ok, sounds good."]), '8'
+            else:
+                human, label = rng.choice(HUMAN_LINES)
+                human = rng.choice(FILLERS) + human
+            expected = label
+            if rng.random() < 0.08:
+                # The LLM does not always agree with itself on borderline turns.
+                label = rng.choice(STAGE_IDS[1:])
+            examples.append(dict(human=human, agent=agent, stage=stage, turns=turns, label=label, expected=expected))
+            if label == '8':
+                break
+            stage, turns = label, turns + 2
+        grouped.append(examples)
+    return grouped
+
+
+def history_of(example):
+    """
+    Rebuilds a history ending with the turn of a logged decision, as SalesGPT writes it: the
+    agent's replies without the name prefix, alternating with the professional's messages.
+    """
+    return ["Hello <END_OF_TURN>", "Hi <END_OF_TURN>"] * max(example['turns'] // 2 - 1, 0) + [
+        f"{example['agent']} <END_OF_TURN>", f"{example['human']} <END_OF_TURN>"]
+
+
+def evaluate(classifier, examples):
+    """
+    Returns the share of turns decided locally, their agreement with the LLM, their agreement with
+    the stage intended by the generated conversations (None for logged decisions) and the mean decision time.
+    """
+    decided = agreed = expected = 0
+    start = time.perf_counter()
+    for example in examples:
+        stage_id = classifier.classify(history_of(example), example['stage'], 'Sophia')
+        if stage_id is not None:
+            decided += 1
+            agreed += stage_id == example['label']
+            expected += stage_id == example.get('expected')
+    elapsed = time.perf_counter() - start
+    precision = expected / max(decided, 1) if 'expected' in examples[0] else None
+    return decided / len(examples), agreed / max(decided, 1), precision, elapsed / len(examples)
+
+
+def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    llm_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.4
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.9
+    log_path = sys.argv[4] if len(sys.argv) > 4 else None
+
+    if log_path:
+        grouped = [[example] for example in load_examples(log_path)]
+    else:
+        grouped = generate_examples(conversations)
+    random.Random(1).shuffle(grouped)
+    split = int(len(grouped) * 0.8)
+    train = [e for group in grouped[:split] for e in group]
+    test = [e for group in grouped[split:] for e in group]
+    print(f"{len(train)} training turns, {len(test)} replayed turns")
+
+    start = time.perf_counter()
+    model = LogisticStageModel().fit(train)
+    print(f"training              {time.perf_counter() - start:>8.2f}s")
+
+    print(f"{'':<22}{'local':>8}{'agreement':>11}{'intended':>10}{'decision':>12}")
+    for name, classifier in [('keyword rules', StageClassifier(threshold=threshold, log_path='')),
+                             ('rules + model', StageClassifier(model, threshold=threshold, log_path=''))]:
+        coverage, agreement, precision, seconds = evaluate(classifier, test)
+        intended = f"{precision:.1%}" if precision is not None else '-'
+        print(f"{name:<22}{coverage:>8.0%}{agreement:>11.1%}{intended:>10}{seconds * 1e6:>10.1f}us")
+
+    chain = StageAnalyzerChain.from_llm(FakeChatModel(responses=['4'], first_token_latency=llm_latency), verbose=False)
+    sample = test[:10]
+    start = time.perf_counter()
+    for example in sample:
+        chain.run(conversation_history='"\n"'.join(history_of(example)), current_conversation_stage=example['stage'])
+    llm_seconds = (time.perf_counter() - start) / len(sample)
+    print(f"{'LLM stage analyzer':<22}{'0%':>8}{'100.0%':>11}{'-':>10}{llm_seconds * 1e3:>10.1f}ms")
+    print(f"mean stage decision with rules + model: {(1 - coverage) * llm_seconds * 1e3 + seconds * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
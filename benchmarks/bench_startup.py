@@ -0,0 +1,58 @@
+"""
+Benchmark of the startup path: time to import the conversation and campaign modules in a
+fresh interpreter, and latency of the first and following conversations (agent creation,
+seeding and opening message) with a stub LLM served from the shared registry.
+
+Usage: python benchmarks/bench_startup.py [conversations]
+"""
+import os
+import subprocess
+import sys
+import time
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+IMPORT_SNIPPET = """
+import time, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def import_time(module, runs=3):
+    """Returns the best import time of a module, in seconds, over fresh interpreters."""
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET.format(module=module)], cwd=SRC,
+                                capture_output=True, text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return min(times)
+
+
+def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for module in ['conversation', 'campaign']:
+        print(f"import {module:<14}{import_time(module) * 1000:>8.0f}ms")
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    from conversation import GPT
+    from fakes import FakeChatModel
+    from llm_registry import registry, get_llm
+    registry.register('llm', lambda: FakeChatModel(responses=['Hello, I am Sophia from the R&D team. <END_OF_TURN>']))
+    latencies = []
+    for i in range(conversations):
+        start = time.perf_counter()
+        agent = GPT.from_llm(get_llm('llm'), history_window=10, professional_name=f"Professional{i}",
+                             conversation_purpose="Introduce the new products.")
+        agent.seed_agent()
+        agent.step()
+        latencies.append(time.perf_counter() - start)
+    print(f"first conversation    {latencies[0] * 1000:>8.1f}ms")
+    print(f"next conversations    {sum(latencies[1:]) / max(len(latencies) - 1, 1) * 1000:>8.1f}ms on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Scaling benchmark of the campaign supervisor: the same roster is run by a Supervisor with one
+worker process and with `workers` processes, in polling mode, every worker talking to its own
+in-process fakes of Slack (with the scripted professionals of bench_campaign) and of the chat
+model. It reports conversations per hour and the p50/p99 turn latency for both runs.
+
+The workers only help when the conversations are CPU-bound (normalization, prompt rendering,
+parsing) and there are cores to spread them on, so the number of CPUs is printed as well;
+a low llm_latency makes the run CPU-bound.
+
+Before the runs, it checks in a spawned worker that went through the import chain of
+src/main.py, as the workers of `python src/main.py --workers N` do, that the Slack transport
+gets the worker's share of the rate limits.
+
+Usage: python benchmarks/bench_supervisor.py [professionals] [workers] [llm_latency] [think_time]
+"""
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import warnings
+warnings.filterwarnings('ignore')
+import numpy as np
+from bench_campaign import SCRIPTS, SCRIPT_WEIGHTS, scripted_llm_reply, generate_dataset
+from roster import Roster
+from supervisor import Supervisor, configure_worker
+
+
+class EmailResolver:
+    """Resolver stand-in leaving every professional without a Slack ID, so workers are assigned by email."""
+
+    def resolve_many(self, emails):
+        return {}
+
+
+def script_of(email):
+    """Picks the script of a professional from a hash of the email, the same in every process."""
+    draw = int.from_bytes(hashlib.sha256(email.encode()).digest()[:8], 'big') / 2 ** 64
+    for name, weight in SCRIPT_WEIGHTS.items():
+        draw -= weight
+        if draw < 0:
+            return SCRIPTS[name]
+    return SCRIPTS['busy']
+
+
+def check_worker(name, workers, results):
+    """
+    Worker process of the rate share check: imports src/main.py as __mp_main__, as spawn does
+    for the workers of main.py, then configures the worker and reports the rate share and the
+    tier 3 bucket rate of the Slack transport used by the campaign and by slack_integration.
+    """
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'main.py'),
+                   run_name='__mp_main__')
+    configure_worker(name, workers)
+    import slack_integration
+    from slack_transport import get_slack_transport
+
+    transport = get_slack_transport()
+    bucket = transport._bucket('conversations.history', {'channel': 'C1'})
+    results.put((transport.rate_share, slack_integration.get_client().rate_share, bucket.rate * 60))
+
+
+def check_rate_share(workers):
+    """Checks the rate share of the Slack transport in a worker spawned after the import chain of main.py."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=check_worker, args=('worker-0', workers, results))
+    process.start()
+    share, client_share, per_minute = results.get(timeout=60)
+    process.join()
+    assert share == client_share == 1.0 / workers, (share, client_share)
+    print(f"Slack rate share of a worker out of {workers}: {share:.2f} ({per_minute:.0f} tier 3 calls/minute)")
+
+
+def bench_worker(name, professionals, events, results, workers=1):
+    """Worker process of the benchmark: run_worker with fakes of Slack and of the chat model."""
+    configure_worker(name, workers)
+    import asyncio
+    import slack_integration
+    from campaign import Campaign
+    from config import Config
+    from fakes import FakeSlackClient, FakeChatModel, FakeCalendlyServer, ProfessionalSimulator
+    from llm_executor import get_llm_executor
+
+    client = FakeSlackClient()
+    slack_integration.client = client
+    scripts = {client.add_user(p['EMAIL']): script_of(p['EMAIL'].lower()) for p in professionals}
+    think_time, llm_latency = float(os.environ['BENCH_THINK_TIME']), float(os.environ['BENCH_LLM_LATENCY'])
+    simulator = ProfessionalSimulator(client, scripts.get, think_time=think_time).start()
+    calendly = FakeCalendlyServer(latency=0.2).start()
+    Config.CALENDLY_API_URL = calendly.url
+    llm = get_llm_executor().wrap(FakeChatModel(responder=scripted_llm_reply, first_token_latency=llm_latency,
+                                                token_latency=llm_latency / 20))
+    campaign = Campaign(client, llm, llm, worker_id=name, poll_interval=0.05)
+    with contextlib.redirect_stdout(io.StringIO()):
+        states = asyncio.run(campaign.run(professionals))
+    simulator.stop()
+    calendly.stop()
+    with open(os.path.join(os.environ['BENCH_LATENCY_DIR'], f"{name}.json"), 'w') as f:
+        json.dump(simulator.turn_latencies, f)
+    results.put([(state.email, state.status) for state in states])
+
+
+def run(records, workers):
+    """Runs the campaign with a number of workers, returns (seconds, statuses, turn latencies)."""
+    latency_dir = tempfile.mkdtemp(prefix='bench_supervisor_')
+    os.environ['BENCH_LATENCY_DIR'] = latency_dir
+    supervisor = Supervisor(workers, resolver=EmailResolver(), listen_events=False, worker=bench_worker)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        statuses = supervisor.run(records)
+    elapsed = time.perf_counter() - start
+    latencies = []
+    for name in os.listdir(latency_dir):
+        with open(os.path.join(latency_dir, name)) as f:
+            latencies += json.load(f)
+    return elapsed, statuses, np.array(latencies) * 1000
+
+
+def main():
+    professionals = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    llm_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    think_time = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
+    os.environ.update({'BENCH_LLM_LATENCY': str(llm_latency), 'BENCH_THINK_TIME': str(think_time)})
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_supervisor_'), 'dataset.csv')
+    generate_dataset(path, professionals)
+    records, _ = Roster.load(path, parquet_cache='').select()
+    check_rate_share(workers)
+    print(f"{professionals} professionals, {llm_latency * 1000:.0f}ms to the first token, "
+          f"{think_time}s think time, {os.cpu_count()} CPUs")
+    print(f"{'workers':<10}{'elapsed':>10}{'conv/hour':>11}{'p50':>9}{'p99':>9}  statuses")
+    for count in sorted({1, workers}):
+        elapsed, statuses, latencies = run(records, count)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'), float('nan'))
+        print(f"{count:<10}{elapsed:>9.1f}s{sum(statuses.values()) / elapsed * 3600:>11.0f}{p50:>7.0f}ms{p99:>7.0f}ms  "
+              + ', '.join(f"{n} {s}" for s, n in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
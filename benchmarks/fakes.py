@@ -0,0 +1,514 @@
+"""
+Offline stand-ins of Slack, Azure OpenAI and Calendly used by the benchmarks.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from slack_events import sign_slack_request
+
+
+class FakeSlackClient:
+    """
+    In-memory stand-in for the Slack transport used to exercise the campaign offline.
+    It keeps the messages of every channel and, when an events URL is given, delivers
+    the professional's messages to a SlackEventListener the way the Events API does.
+    """
+
+    def __init__(self, events_url=None, signing_secret=None, bot_id='BFAKE'):
+        """
+        Args:
+            events_url (str): URL of a SlackEventListener receiving message events.
+            signing_secret (str): Secret used to sign the delivered events.
+            bot_id (str): Bot ID attached to the messages posted through the client.
+        """
+        self.events_url = events_url
+        self.signing_secret = signing_secret
+        self.bot_id = bot_id
+        self.users = {}
+        self.channels = {}
+        self.calls = Counter()
+        # Monotonic time of the latest message posted or updated by the bot, by channel.
+        self.bot_writes = {}
+        self._lock = threading.Lock()
+        self._last_ts = 0.0
+        self._event_count = 0
+
+    def _next_ts(self):
+        """Returns a unique, increasing Slack timestamp."""
+        self._last_ts = max(time.time(), self._last_ts + 0.000001)
+        return f"{self._last_ts:.6f}"
+
+    def add_user(self, email, user_id=None):
+        """Registers a workspace member and returns its user ID."""
+        user_id = user_id or f"U{len(self.users) + 1:08d}"
+        self.users[email.lower()] = user_id
+        return user_id
+
+    def users_lookupByEmail(self, email):
+        self.calls['users.lookupByEmail'] += 1
+        user_id = self.users.get(email.lower())
+        if user_id is None:
+            return {"ok": False, "error": "users_not_found"}
+        return {"ok": True, "user": {"id": user_id, "profile": {"email": email}}}
+
+    def users_list(self, limit=200, cursor=None, **kwargs):
+        self.calls['users.list'] += 1
+        members = [{"id": user_id, "name": email.split('@')[0], "deleted": False, "is_bot": False, "profile": {"email": email}}
+                   for email, user_id in self.users.items()]
+        offset = int(cursor or 0)
+        has_more = offset + limit < len(members)
+        return {"ok": True, "members": members[offset:offset + limit],
+                "response_metadata": {"next_cursor": str(offset + limit) if has_more else ""}}
+
+    def conversations_open(self, users):
+        self.calls['conversations.open'] += 1
+        channel_id = 'D' + users[0][1:]
+        with self._lock:
+            self.channels.setdefault(channel_id, [])
+        return {"ok": True, "channel": {"id": channel_id}}
+
+    def chat_postMessage(self, channel, text, **kwargs):
+        self.calls['chat.postMessage'] += 1
+        with self._lock:
+            message = {"type": "message", "text": text, "ts": self._next_ts(), "bot_id": self.bot_id}
+            self.channels.setdefault(channel, []).insert(0, message)
+            self.bot_writes[channel] = time.monotonic()
+        return {"ok": True, "channel": channel, "ts": message["ts"], "message": message}
+
+    def chat_update(self, channel, ts, text, **kwargs):
+        self.calls['chat.update'] += 1
+        with self._lock:
+            for message in self.channels.get(channel, []):
+                if message['ts'] == ts:
+                    message['text'] = text
+                    self.bot_writes[channel] = time.monotonic()
+                    return {"ok": True, "channel": channel, "ts": ts, "text": text}
+        return {"ok": False, "error": "message_not_found"}
+
+    def chat_delete(self, channel, ts, **kwargs):
+        self.calls['chat.delete'] += 1
+        with self._lock:
+            messages = self.channels.get(channel, [])
+            for i, message in enumerate(messages):
+                if message['ts'] == ts:
+                    del messages[i]
+                    self.bot_writes[channel] = time.monotonic()
+                    return {"ok": True, "channel": channel, "ts": ts}
+        return {"ok": False, "error": "message_not_found"}
+
+    def conversations_history(self, channel, limit=100, oldest=None, cursor=None, **kwargs):
+        self.calls['conversations.history'] += 1
+        with self._lock:
+            messages = [dict(m) for m in self.channels.get(channel, [])
+                        if oldest is None or float(m['ts']) > float(oldest)]
+        offset = int(cursor or 0)
+        page = messages[offset:offset + limit]
+        has_more = offset + limit < len(messages)
+        return {"ok": True, "messages": page, "has_more": has_more,
+                "response_metadata": {"next_cursor": str(offset + limit) if has_more else ""}}
+
+    def user_says(self, channel, text, user=None):
+        """
+        Posts a message as the professional of a channel and delivers the matching event.
+
+        Args:
+            channel (str): Channel ID of the conversation.
+            text (str): Message text.
+            user (str): User ID of the sender, defaults to the user behind the DM channel.
+        """
+        with self._lock:
+            message = {"type": "message", "text": text, "ts": self._next_ts(),
+                       "user": user or 'U' + channel[1:], "channel": channel, "channel_type": "im"}
+            self.channels.setdefault(channel, []).insert(0, message)
+            self._event_count += 1
+            event_id = f"Ev{self._event_count:010d}"
+        if self.events_url:
+            self._deliver_event(message, event_id)
+        return message
+
+    def _deliver_event(self, event, event_id):
+        """Sends an event callback to the events URL, signed like Slack does."""
+        body = json.dumps({"type": "event_callback", "event_id": event_id, "event": event}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.signing_secret:
+            headers.update(sign_slack_request(self.signing_secret, body))
+        request = urllib.request.Request(self.events_url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model with configurable latency. Replies come from a responder callable
+    receiving the prompt text, or cycle through a fixed list, and are streamed word by word.
+    """
+
+    responses: List[str] = []
+    responder: Optional[Callable[[str], str]] = None
+    # Seconds before the first token and between two streamed tokens.
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _next_response(self, messages: List[BaseMessage]) -> str:
+        """Picks the reply to the given messages."""
+        with _fake_lock:
+            index = self.calls
+            self.calls += 1
+        if self.responder is not None:
+            return self.responder("\n".join(str(m.content) for m in messages))
+        return self.responses[index % len(self.responses)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._next_response(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(_tokenize(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self._next_response(messages)
+        time.sleep(self.first_token_latency)
+        for token in _tokenize(text):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    # Async versions, so concurrent requests wait on the event loop rather than on the
+    # default thread pool that BaseChatModel falls back to without them.
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = self._next_response(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(_tokenize(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._next_response(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for token in _tokenize(text):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+_fake_lock = threading.Lock()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Offline embedding model returning deterministic unit vectors derived from a hash of
+    the text, and counting the embedding requests and texts it receives.
+    """
+
+    def __init__(self, size=1536, latency=0.0):
+        """
+        Args:
+            size (int): Dimension of the vectors.
+            latency (float): Seconds spent on every request.
+        """
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        with _fake_lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _tokenize(text):
+    """Splits a text into word-sized tokens, keeping the whitespace."""
+    return re.findall(r'\S+\s*|\s+', text)
+
+
+class _BurstHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server accepting large bursts of concurrent connections."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeChatCompletionsServer:
+    """
+    Local HTTP server speaking the Azure OpenAI chat completions protocol, plain and
+    streamed, so the real AzureChatOpenAI client can be exercised offline. It counts the
+    requests received and the highest number of requests served at once.
+    """
+
+    def __init__(self, responses=None, responder=None, latency=0.0, token_latency=0.0, host='127.0.0.1', port=0):
+        """
+        Args:
+            responses (list): Replies returned in turn when no responder is given.
+            responder (callable): Function receiving the prompt text and returning the reply.
+            latency (float): Seconds before the reply, or before the first streamed token.
+            token_latency (float): Seconds between two streamed tokens.
+            host (str): Interface the server listens on.
+            port (int): Port the server listens on, 0 picks a free one.
+        """
+        self.responses = responses or ['OK']
+        self.responder = responder
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = _BurstHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Endpoint to give to AzureChatOpenAI as azure_endpoint."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reply(self, messages):
+        """Picks the reply to the messages of a request."""
+        with self._lock:
+            index = self.requests
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self.responder is not None:
+            return self.responder("\n".join(str(m.get('content')) for m in messages))
+        return self.responses[index % len(self.responses)]
+
+    def _done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.split('?')[0].endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                try:
+                    text = server.reply(body.get('messages', []))
+                    time.sleep(server.latency)
+                    if body.get('stream'):
+                        self._stream(text, body)
+                    else:
+                        self._complete(text, body)
+                finally:
+                    server._done()
+
+            def _chunk(self, delta, finish_reason=None):
+                return {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": "fake",
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+            def _complete(self, text, body):
+                prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+                completion_tokens = len(_tokenize(text))
+                payload = json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": "fake",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, text, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                chunks = [self._chunk({"role": "assistant", "content": ""})]
+                chunks += [self._chunk({"content": token}) for token in _tokenize(text)]
+                chunks.append(self._chunk({}, "stop"))
+                for i, chunk in enumerate(chunks):
+                    if i > 1:
+                        time.sleep(server.token_latency)
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+class FakeCalendlyServer:
+    """
+    Local HTTP server standing in for the Calendly scheduling links API. It returns a new
+    booking URL for every request and can answer the first requests with errors, so the
+    retries and the link pool can be exercised offline.
+    """
+
+    def __init__(self, latency=0.0, errors=(), retry_after=0, host='127.0.0.1', port=0):
+        """
+        Args:
+            latency (float): Seconds before every response.
+            errors (iterable): HTTP statuses returned, in turn, by the first requests (e.g. [429, 500]).
+            retry_after (float): Retry-After header of the 429 responses.
+            host (str): Interface the server listens on.
+            port (int): Port the server listens on, 0 picks a free one.
+        """
+        self.latency = latency
+        self.errors = list(errors)
+        self.retry_after = retry_after
+        self.requests = 0
+        self.links = 0
+        self.payloads = []
+        self._lock = threading.Lock()
+        self._server = _BurstHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to give to CalendlyClient."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if self.path != '/scheduling_links':
+                    self.send_error(404)
+                    return
+                time.sleep(server.latency)
+                with server._lock:
+                    server.requests += 1
+                    status = server.errors.pop(0) if server.errors else 201
+                    if status == 201:
+                        server.links += 1
+                        server.payloads.append(body)
+                        link = f"https://calendly.com/d/fake-{server.links:06d}"
+                if status != 201:
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header('Retry-After', str(server.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                payload = json.dumps({"resource": {"booking_url": link, "max_event_count": body.get("max_event_count"),
+                                                   "owner": body.get("owner"), "owner_type": body.get("owner_type")}}).encode()
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+class ProfessionalSimulator:
+    """
+    Scripted professionals answering the agent on a FakeSlackClient. Every DM channel gets
+    the script of its user and sends its next line once the agent's latest message has not
+    changed for `settle` seconds (streamed replies are updated in place) and `think_time`
+    has passed. The time between a line and the last write of the agent's answer is
+    recorded as the latency of the turn.
+    """
+
+    def __init__(self, client, scripts, think_time=0.0, settle=0.2, interval=0.01):
+        """
+        Args:
+            client (FakeSlackClient): Slack stand-in the campaign talks to.
+            scripts (callable): Called with a user ID, returns the lines of that professional, an
+                empty list for a professional who never answers.
+            think_time (float): Seconds between the agent's message and the professional's answer.
+            settle (float): Seconds without update after which the agent's message is complete,
+                above SLACK_STREAM_UPDATE_INTERVAL when replies are streamed.
+            interval (float): Seconds between two checks of the channels.
+        """
+        self.client = client
+        self.scripts = scripts
+        self.think_time = think_time
+        self.settle = settle
+        self.interval = interval
+        self.turn_latencies = []
+        self.lines_sent = 0
+        self._channels = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='professional-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            now = time.monotonic()
+            for channel, last_write in list(self.client.bot_writes.items()):
+                state = self._channels.get(channel)
+                if state is None:
+                    state = self._channels[channel] = {'lines': list(self.scripts('U' + channel[1:])), 'sent_at': None}
+                if not state['lines']:
+                    continue
+                if state['sent_at'] is not None and last_write <= state['sent_at']:
+                    continue
+                if now - last_write < max(self.settle, self.think_time):
+                    continue
+                if state['sent_at'] is not None:
+                    self.turn_latencies.append(last_write - state['sent_at'])
+                state['sent_at'] = time.monotonic()
+                self.client.user_says(channel, state['lines'].pop(0))
+                self.lines_sent += 1
@@ -1,27 +1,227 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from config import Config
+from instrumentation import span
+
+
+class CalendlyError(Exception):
+    """Raised when a scheduling link cannot be created."""
+
+
+class CalendlyClient:
+    """
+    Creates single-use Calendly scheduling links over one pooled HTTP session, retrying
+    rate-limited (honouring Retry-After), failed and timed out requests with exponential backoff.
+    """
+
+    def __init__(self, api_key=None, event_uuid=None, base_url=None, max_retries=None, timeout=10, max_connections=10):
+        """
+        Args:
+            api_key (str): Calendly API key, defaults to Config.CALENDLY_API_KEY.
+            event_uuid (str): UUID of the event type the links book, defaults to Config.CALENDLY_EVENT_UUID.
+            base_url (str): Base URL of the Calendly API, defaults to Config.CALENDLY_API_URL.
+            max_retries (int): Attempts of a link creation, defaults to Config.CALENDLY_MAX_RETRIES.
+            timeout (float): Seconds before an HTTP request times out.
+            max_connections (int): Size of the connection pool.
+        """
+        self.api_key = api_key or Config.CALENDLY_API_KEY
+        self.event_uuid = event_uuid or Config.CALENDLY_EVENT_UUID
+        self.base_url = (base_url or Config.CALENDLY_API_URL).rstrip('/')
+        self.max_retries = max_retries or Config.CALENDLY_MAX_RETRIES
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        })
+
+    def create_link(self):
+        """
+        Creates a scheduling link for a single event.
+
+        Returns:
+            str: Booking URL of the link.
+
+        Raises:
+            CalendlyError: If the link could not be created after max_retries attempts.
+        """
+        payload = {
+            "max_event_count": 1,  # Limits the number of events that can be scheduled.
+            "owner": f"https://api.calendly.com/event_types/{self.event_uuid}",  # Specify the event type by UUID.
+            "owner_type": "EventType"  # Owner type is set to 'EventType'.
+        }
+        delay = 1.0
+        error = None
+        with span('calendly', 'scheduling_links') as call_span:
+            for attempt in range(self.max_retries):
+                if call_span is not None:
+                    call_span.set(retries=attempt)
+                try:
+                    response = self.session.post(f"{self.base_url}/scheduling_links", json=payload, timeout=self.timeout)
+                except requests.RequestException as e:
+                    error = str(e)
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                if response.status_code == 201:
+                    return response.json()['resource']['booking_url']
+                error = f"{response.status_code}, {response.text}"
+                if response.status_code == 429:
+                    time.sleep(float(response.headers.get('Retry-After', delay)))
+                elif response.status_code >= 500:
+                    time.sleep(delay)
+                else:
+                    break
+                delay *= 2
+            raise CalendlyError(f"Failed to create Calendly link: {error}")
+
+
+class CalendlyLinkPool:
+    """
+    Pool of single-use scheduling links created ahead of time, so a professional asking for a
+    demo gets a link without waiting for the Calendly API. A background thread tops the pool
+    up to the watermark, creating batch_size links at once, whenever a handout takes it below.
+    Links left when the pool is stopped are saved and reused by the next run.
+    """
+
+    def __init__(self, client=None, watermark=None, batch_size=None, path=None):
+        """
+        Args:
+            client (CalendlyClient): Client creating the links, defaults to a new one.
+            watermark (int): Number of links kept ready, defaults to Config.CALENDLY_POOL_WATERMARK.
+            batch_size (int): Links created concurrently during a refill, defaults to Config.CALENDLY_POOL_BATCH.
+            path (str): JSON file keeping the unused links between runs, defaults to Config.CALENDLY_POOL_PATH (disabled when empty).
+        """
+        self.client = client or CalendlyClient()
+        self.watermark = watermark if watermark is not None else Config.CALENDLY_POOL_WATERMARK
+        self.batch_size = max(batch_size or Config.CALENDLY_POOL_BATCH, 1)
+        self.path = path if path is not None else Config.CALENDLY_POOL_PATH
+        self.links = deque()
+        self.handed_out = 0
+        self.misses = 0
+        self.created = 0
+        self.failures = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.batch_size)
+
+    def start(self):
+        """Loads the saved links and starts the background refill."""
+        with self._start_lock:
+            if self._thread is not None:
+                return self
+            if self.path and os.path.exists(self.path):
+                with open(self.path) as f:
+                    self.links.extend(json.load(f))
+                os.remove(self.path)
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._refill_loop, name='calendly-refill', daemon=True)
+            self._thread.start()
+            self._wake.set()
+        return self
+
+    def stop(self):
+        """Stops the background refill and saves the unused links."""
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._stopped.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        if self.path and self.links:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(list(self.links), f)
+
+    def get(self):
+        """
+        Hands out an unused scheduling link.
+
+        Returns:
+            str: Booking URL, created on the spot when the pool is empty, None if that fails too.
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            link = self.links.popleft()
+        except IndexError:
+            link = None
+        if len(self.links) < self.watermark:
+            self._wake.set()
+        if link is not None:
+            self.handed_out += 1
+            return link
+        self.misses += 1
+        try:
+            return self.client.create_link()
+        except CalendlyError as e:
+            print(e)
+            return None
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stopped.is_set() and len(self.links) < self.watermark:
+                count = min(self.batch_size, self.watermark - len(self.links))
+                futures = [self._executor.submit(self.client.create_link) for _ in range(count)]
+                failed = 0
+                for future in futures:
+                    try:
+                        self.links.append(future.result())
+                        self.created += 1
+                    except CalendlyError as e:
+                        failed += 1
+                        print(e)
+                self.failures += failed
+                if failed == count:
+                    # The API keeps failing, retry on the next handout instead of spinning.
+                    break
+
+    def stats(self):
+        """
+        Returns:
+            dict: Links available, handed out from the pool, created on the spot (misses), created in the background and failed.
+        """
+        return {
+            'available': len(self.links),
+            'handed_out': self.handed_out,
+            'misses': self.misses,
+            'created': self.created,
+            'failures': self.failures,
+        }
+
+
+_link_pool = None
+_link_pool_lock = threading.Lock()
+
+
+def get_link_pool():
+    """Returns the scheduling link pool shared by the process."""
+    global _link_pool
+    with _link_pool_lock:
+        if _link_pool is None:
+            _link_pool = CalendlyLinkPool()
+        return _link_pool
+
 
 def generate_calendly_invitation_link():
-    # Setup headers for the API request, including the authorization token from the config.
-    headers = {
-        'Authorization': f'Bearer {Config.CALENDLY_API_KEY}',
-        'Content-Type': 'application/json'
-    }
-    # Calendly API URL for creating scheduling links.
-    url = 'https://api.calendly.com/scheduling_links'
-    # Payload for the POST request, defining the maximum number of events and the owner details.
-    payload = {
-        "max_event_count": 1,  # Limits the number of events that can be scheduled.
-        "owner": f"https://api.calendly.com/event_types/{Config.CALENDLY_EVENT_UUID}",  # Specify the event type by UUID.
-        "owner_type": "EventType"  # Owner type is set to 'EventType'.
-    }
-    
-    # Send a POST request to the Calendly API to create a scheduling link.
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 201:  # Check if the request was successful (HTTP 201 Created).
-        data = response.json()  # Parse the JSON response.
-        return data['resource']['booking_url']  # Return the booking URL from the response.
-    else:
-        # Print the error if the link creation fails and return None.
-        print(f"Failed to create Calendly link: {response.status_code}, {response.text}")
-        return None
\ No newline at end of file
+    """
+    Returns a single-use Calendly scheduling link for a demo, taken from the link pool.
+
+    Returns:
+        str: Booking URL, None if no link could be created.
+    """
+    return get_link_pool().get()
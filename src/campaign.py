@@ -0,0 +1,439 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from slack_integration import SlackUserResolver, fetch_new_messages, get_channel_cursor, forget_channel_cursor, AdaptiveBackoff, SlackMessageStreamer
+from calendly import generate_calendly_invitation_link, get_link_pool
+from conversation import GPT, conversation_stages
+from config import Config
+from llm_cache import get_llm_cache, with_response_cache
+from normalizer import normalize_slack_text
+from conversation_analysis import ConversationAnalysisChain, build_transcript
+from llm_registry import get_chain
+from memory_store import get_memory_store
+from embedding_cache import get_embedding_cache
+from state_store import get_state_store, default_worker_id
+from instrumentation import get_instrumentation, current_conversation
+from stage_classifier import get_stage_classifier
+
+
+class ConversationState:
+    """
+    Lightweight state kept for every professional taking part in a campaign.
+    It replaces the local variables that main() used to keep for the single
+    conversation it was driving.
+    """
+
+    def __init__(self, professional):
+        """
+        Args:
+            professional (dict): Roster record of the professional (FIRST_NAME, LAST_NAME, EMAIL, ...).
+        """
+        self.professional = professional
+        self.email = professional['EMAIL'].lower()
+        self.first_name = professional['FIRST_NAME']
+        self.last_name = professional['LAST_NAME']
+        self.slack_id = None
+        self.channel_id = None
+        self.agent = None
+        self.sending_message = None
+        self.response_count = 0
+        self.start_time = None
+        self.status = 'pending'
+        # ID of the conversation in the state store, and whether it was resumed from a snapshot.
+        self.conversation_id = None
+        self.resumed = False
+
+    def elapsed_minutes(self):
+        """Returns the number of minutes since the first message was sent."""
+        return (time.time() - self.start_time) / 60
+
+    def snapshot(self):
+        """Returns the state to save in the state store, the agent's history excepted."""
+        return dict(
+            slack_id=self.slack_id,
+            sending_message=self.sending_message,
+            response_count=self.response_count,
+            start_time=self.start_time,
+            status=self.status,
+            cursor_oldest=get_channel_cursor(self.channel_id).oldest,
+            agent=self.agent.snapshot(),
+        )
+
+    def restore(self, snapshot, history):
+        """Restores the state and the agent saved by snapshot(), the agent must already be created."""
+        self.sending_message = snapshot['sending_message']
+        self.response_count = snapshot['response_count']
+        self.start_time = snapshot['start_time']
+        self.status = snapshot['status']
+        get_channel_cursor(self.channel_id).oldest = snapshot['cursor_oldest']
+        self.agent.restore(snapshot['agent'], history)
+        self.resumed = True
+
+
+def build_agent_config(professional):
+    """
+    Builds the keyword arguments used to create the marketing agent for a professional.
+
+    Args:
+        professional (dict): Roster record of the professional.
+
+    Returns:
+        dict: Arguments for GPT.from_llm.
+    """
+    return dict(
+        person_name = "Sophia",
+        person_role = "To promote new products, features, trainings and gathering feedbacks from accounting professionals",
+        team_name = "R&D",
+        conversation_type = "chat",
+        conversation_purpose = f"Introduce {professional['RECOMMENDATION']} product/products explainng how it helps them, and recommend taking training and exploring {professional['TRAINING_NOT_STARTED']}, aslo recommend professional to complete training on {professional['TRAINING_IN_PROGRESS']} product since we know based on trainings data. Ask for {professional['FEEDBACK']} on  {professional['PRODUCT_NAME_USED']} product and later congratulate them for completing the {professional['TRAINING_COMPLETED']} training. Finally ask if there are interested in demo on any products they like.",
+        conversation_history = [],
+        conversation_stage = conversation_stages.get('1'),
+        professional_name = professional['FIRST_NAME'],
+        combined_stage_and_utterance = Config.COMBINED_STAGE_AND_REPLY,
+        history_window = Config.CONTEXT_MAX_TURNS,
+        track_prompt_tokens = Config.REPORT_PROMPT_TOKENS,
+        stage_classifier = get_stage_classifier()
+        )
+
+
+class Campaign:
+    """
+    Runs conversations with many professionals concurrently. Every conversation is an
+    asyncio task waiting on its own Slack channel, either for events delivered by a
+    SlackEventRouter or by polling with an adaptive interval, while the blocking Slack and
+    LLM calls are executed in a bounded thread pool. Conversation state is saved in a state
+    store after every turn, so a conversation interrupted by a crash is resumed by the next
+    worker running the campaign instead of being started over.
+    """
+
+    def __init__(self, client, llm, llm_lucas, max_concurrency=None, poll_interval=None, router=None, resolver=None,
+                 state_store=None, worker_id=None):
+        """
+        Args:
+            client (SlackTransport): Slack client used to open channels and post messages.
+            llm: Language model driving the marketing agent.
+            llm_lucas: Deterministic language model used for the post-conversation summary.
+            max_concurrency (int): Maximum number of open conversations, defaults to Config.CAMPAIGN_MAX_CONCURRENCY.
+            poll_interval (float): Minimum seconds between two polls of a channel, defaults to Config.SLACK_POLL_INTERVAL.
+            router (SlackEventRouter): Router delivering Slack message events. When None, channels are polled.
+            resolver (SlackUserResolver): Resolver of the professionals' Slack IDs, defaults to one using client.
+            state_store (StateStore): Store of the conversation state, defaults to get_state_store().
+            worker_id (str): ID of this worker in the state store, defaults to default_worker_id().
+        """
+        self.client = client
+        self.llm = llm
+        # Demo detection and summaries are deterministic, repeated prompts are answered from the response cache.
+        self.llm_lucas = with_response_cache(llm_lucas)
+        self.max_concurrency = max_concurrency or Config.CAMPAIGN_MAX_CONCURRENCY
+        self.poll_interval = poll_interval if poll_interval is not None else Config.SLACK_POLL_INTERVAL
+        self.router = router
+        self.resolver = resolver or SlackUserResolver(client)
+        self.executor = ThreadPoolExecutor(max_workers=Config.CAMPAIGN_WORKER_THREADS)
+        self.state_store = state_store if state_store is not None else get_state_store()
+        self.worker_id = worker_id or default_worker_id()
+
+    async def _run_blocking(self, fn, *args, **kwargs):
+        """Runs a blocking call in the campaign thread pool, in the context of the calling conversation."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def call():
+            get_instrumentation().observe_queue_wait('campaign', 'worker_threads', time.perf_counter() - submitted)
+            return context.run(fn, *args, **kwargs)
+
+        return await loop.run_in_executor(self.executor, call)
+
+    async def run(self, professionals):
+        """
+        Runs the campaign for every professional, keeping at most max_concurrency conversations open.
+
+        Args:
+            professionals (list): Roster records of the professionals to contact.
+
+        Returns:
+            list: ConversationState of every professional once its conversation is over.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        states = [ConversationState(p) for p in professionals]
+        # Resolve every Slack ID up front from the workspace directory rather than one lookup per conversation.
+        user_ids = await self._run_blocking(self.resolver.resolve_many, [s.email for s in states])
+        for state in states:
+            state.slack_id = user_ids.get(state.email)
+
+        async def bounded(state):
+            async with semaphore:
+                try:
+                    await self.run_conversation(state)
+                except Exception as e:
+                    state.status = 'failed'
+                    print(f"Conversation with {state.email} failed: {e}")
+
+        heartbeat = asyncio.create_task(self._heartbeat()) if self.state_store is not None else None
+        instrumentation = get_instrumentation()
+        exporter = asyncio.create_task(self._export_metrics(instrumentation)) if instrumentation.prometheus_path else None
+        # Demo links are created ahead of time, while the conversations are running.
+        link_pool = get_link_pool().start() if Config.CALENDLY_API_KEY else None
+        try:
+            await asyncio.gather(*(bounded(s) for s in states))
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if exporter is not None:
+                exporter.cancel()
+            instrumentation.export()
+            if link_pool is not None:
+                link_pool.stop()
+            self.executor.shutdown(wait=False)
+            memory_store = get_memory_store()
+            if memory_store is not None:
+                memory_store.save()
+        cache = get_llm_cache()
+        if cache is not None:
+            stats = cache.stats()
+            print(f"LLM response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            stats = embedding_cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['requests']} embedding requests")
+        if link_pool is not None:
+            stats = link_pool.stats()
+            print(f"Calendly links: {stats['handed_out']} from the pool, {stats['misses']} created on demand, {stats['available']} left")
+        for kind, name, calls, mean, total in instrumentation.summary()[:5]:
+            print(f"{kind} {name}: {calls} calls, {mean * 1000:.0f} ms mean, {total:.1f} s total")
+        return states
+
+    async def _heartbeat(self):
+        """Keeps the claims of this worker on its conversations alive in the state store."""
+        while True:
+            await self._run_blocking(self.state_store.heartbeat, self.worker_id)
+            await asyncio.sleep(Config.STATE_LEASE_SECONDS / 3)
+
+    async def _export_metrics(self, instrumentation):
+        """Rewrites the Prometheus metrics file while the campaign runs."""
+        while True:
+            await asyncio.sleep(Config.METRICS_EXPORT_INTERVAL)
+            await self._run_blocking(instrumentation.export)
+
+    def _save_state(self, state):
+        """Saves the state of a conversation and logs its new turns."""
+        if self.state_store is not None and state.conversation_id is not None:
+            self.state_store.save(state.conversation_id, state.snapshot(), state.agent.conversation_history)
+
+    async def run_conversation(self, state):
+        """
+        Drives one conversation from the first message to the post-conversation summary.
+
+        Args:
+            state (ConversationState): State of the professional to talk to.
+        """
+        print(state.email)
+        # Labels the spans recorded for this conversation, in this task and the threads it uses.
+        current_conversation.set(state.email)
+        try:
+            opened = await self._run_blocking(self._open_conversation, state)
+            if not opened:
+                return
+            # Register the channel before the first message so no reply can be missed.
+            inbox = self.router.register(state.channel_id) if self.router is not None else None
+            try:
+                if not state.resumed:
+                    await self._run_blocking(self._send_first_message, state)
+                backoff = AdaptiveBackoff(self.poll_interval, Config.SLACK_POLL_MAX_INTERVAL)
+                # Replies posted while a resumed conversation had no worker were never delivered as events.
+                catch_up = state.resumed
+                # A resumed conversation may have ended before the analysis was done.
+                while state.status == 'open':
+                    if inbox is not None and not catch_up:
+                        messages = await self._wait_for_events(state, inbox)
+                    else:
+                        messages = await self._run_blocking(fetch_new_messages, state.channel_id, state.slack_id)
+                        catch_up = False
+                    latest_text = ' '.join(normalize_slack_text(m.get('text', '')) for m in messages)
+                    if await self._handle_reply(state, latest_text):
+                        await self._run_blocking(self._save_state, state)
+                        break
+                    if inbox is None:
+                        await asyncio.sleep(backoff.next(len(messages) > 0))
+            finally:
+                if inbox is not None:
+                    self.router.unregister(state.channel_id)
+                forget_channel_cursor(state.channel_id)
+            await self._run_blocking(self._finish_conversation, state)
+        except Exception:
+            # Close the claim rather than leave it open, skipped by other runs, until the lease expires.
+            state.status = 'failed'
+            if self.state_store is not None and state.conversation_id is not None:
+                await self._run_blocking(self.state_store.release, state.conversation_id, state.status)
+            raise
+        if self.state_store is not None:
+            await self._run_blocking(self.state_store.release, state.conversation_id, state.status)
+
+    async def _wait_for_events(self, state, inbox):
+        """
+        Waits for the professional's next messages, or until the next timeout rule is due.
+
+        Args:
+            state (ConversationState): State of the conversation.
+            inbox (asyncio.Queue): Message events routed to the conversation's channel.
+
+        Returns:
+            list: The new messages of the professional, oldest first, empty when nothing arrived.
+        """
+        threshold = Config.CONVERSATION_NO_RESPONSE_TIMEOUT if state.response_count == 0 else Config.CONVERSATION_IDLE_TIMEOUT
+        wait = max(threshold - state.elapsed_minutes(), 0) * 60 + 0.05
+        try:
+            events = [await asyncio.wait_for(inbox.get(), timeout=wait)]
+        except asyncio.TimeoutError:
+            return []
+        while not inbox.empty():
+            events.append(inbox.get_nowait())
+        return get_channel_cursor(state.channel_id).advance(events)
+
+    def _open_conversation(self, state):
+        """
+        Resolves the professional's Slack ID, seeds the agent, opens the Slack channel and claims
+        the conversation in the state store, restoring it when it was interrupted.
+
+        Returns:
+            bool: False when the conversation cannot be held, or is held by another worker.
+        """
+        if state.slack_id is None:
+            state.slack_id = self.resolver.resolve(state.email)
+        if state.slack_id is None:
+            state.status = 'failed'
+            return False
+        state.agent = GPT.from_llm(self.llm, verbose=False, **build_agent_config(state.professional))
+        state.agent.seed_agent()
+        response = self.client.conversations_open(users=[state.slack_id])
+        if response["ok"]:
+            state.channel_id = response["channel"]["id"]
+        else:
+            raise Exception("Failed to open conversation channel.")
+        if self.state_store is not None:
+            claimed = self.state_store.claim(state.channel_id, self.worker_id, state.email)
+            if claimed is None:
+                print(f'Conversation with {state.email} is held by another worker')
+                state.status = 'claimed'
+                return False
+            state.conversation_id = claimed['conversation_id']
+            if claimed['state'] is not None:
+                state.restore(claimed['state'], self.state_store.turns(state.conversation_id))
+                print(f'Resuming the conversation with {state.email}')
+        return True
+
+    def _send_first_message(self, state):
+        """Generates and sends the opening message of the conversation."""
+        if Config.SLACK_STREAMING:
+            streamer = SlackMessageStreamer(self.client, state.channel_id)
+            state.sending_message = state.agent.step_stream(streamer.update)
+            ts = streamer.finish(state.sending_message)
+        else:
+            state.sending_message = state.agent.step()
+            ts = self.client.chat_postMessage(channel=state.channel_id, text=state.sending_message)["ts"]
+        # Only messages posted after the opening message belong to this conversation.
+        get_channel_cursor(state.channel_id).oldest = ts
+        state.start_time = time.time()
+        state.status = 'open'
+        self._save_state(state)
+
+    async def _handle_reply(self, state, latest_text):
+        """
+        Applies the conversation timeout rules to the latest text of the channel.
+
+        Args:
+            state (ConversationState): State of the conversation.
+            latest_text (str): New text from the professional, empty if nothing arrived.
+
+        Returns:
+            bool: True when the conversation is over.
+        """
+        elapsed = state.elapsed_minutes()
+        if not latest_text:
+            if elapsed > Config.CONVERSATION_NO_RESPONSE_TIMEOUT and state.response_count == 0:
+                print(f'{state.first_name} is busy, no response')
+                state.status = 'busy'
+                return True
+            if elapsed > Config.CONVERSATION_IDLE_TIMEOUT and state.response_count != 0:
+                print(f'{state.first_name} not completed the conversation')
+                state.status = 'not_completed'
+                return True
+            return False
+
+        if elapsed < Config.CONVERSATION_MAX_DURATION:
+            ended = await self._run_blocking(self._reply, state, latest_text)
+            if ended:
+                print(f'{state.first_name} completed the conversation')
+                state.status = 'completed'
+            return ended
+        if elapsed > Config.CONVERSATION_LATE_REPLY_AFTER:
+            ended = await self._run_blocking(self._reply, state, latest_text)
+            if not ended:
+                print(f'{state.first_name} not completed the conversation')
+                state.status = 'not_completed'
+            else:
+                state.status = 'completed'
+            return True
+        return False
+
+    def _reply(self, state, latest_text):
+        """
+        Feeds the professional's text to the agent and posts its answer.
+
+        Returns:
+            bool: True when the agent decided to end the conversation.
+        """
+        state.response_count = state.response_count + 1
+        print(state.sending_message)
+        print('-----')
+        print(latest_text)
+        print('====================')
+        state.agent.human_step(latest_text)
+        reported = len(state.agent.prompt_token_counts)
+        ended = self._post_reply(state)
+        if Config.REPORT_PROMPT_TOKENS:
+            turn_counts = state.agent.prompt_token_counts[reported:]
+            print(f"{state.first_name} turn {state.response_count} prompt tokens: " + ', '.join(f"{c['chain']}={c['tokens']}" for c in turn_counts))
+        self._save_state(state)
+        return ended
+
+    def _post_reply(self, state):
+        """Generates the agent's reply and posts it, returns True when the conversation is over."""
+        if Config.SLACK_STREAMING:
+            streamer = SlackMessageStreamer(self.client, state.channel_id)
+            reply = state.agent.respond_stream(streamer.update, streamer.restart)
+            if reply is None:
+                return True
+            streamer.finish(reply)
+        else:
+            reply = state.agent.respond()
+            if reply is None:
+                return True
+            self.client.chat_postMessage(channel=state.channel_id, text=reply)
+        state.sending_message = reply
+        return False
+
+    def _finish_conversation(self, state):
+        """
+        Analyzes the transcript in a single LLM call, sends the demo link if the professional
+        asked for one and posts the summary. No embeddings are computed for the analysis.
+        """
+        transcript = build_transcript(state.agent.get_conversation_history_backup(), state.agent.person_name, state.first_name)
+        demo, summary = get_chain(ConversationAnalysisChain, self.llm_lucas).analyze(transcript)
+        memory_store = get_memory_store()
+        if memory_store is not None:
+            # Kept for later campaigns, the turns and the summary are embedded in a single batch.
+            turns = transcript.split("\n")
+            memory_store.add_texts(turns + [f"Summary - {summary}"], professional=state.email,
+                                   metadatas=[{'kind': 'turn'}] * len(turns) + [{'kind': 'summary'}])
+        if demo:
+            sending_message_meeting = generate_calendly_invitation_link()
+            self.client.chat_postMessage(channel=state.channel_id, text=f"Below is the meeting link for demo {state.first_name}\n===========================================\n")
+            self.client.chat_postMessage(channel=state.channel_id, text=sending_message_meeting)
+
+        sending_message_summary = f"Hi {Config.SUMMARY_RECIPIENT_NAME}, Below is the summary conversation happened with {state.first_name} {state.last_name}\n==========\n{summary}\n==========="
+        if Config.SUMMARY_CHANNEL_ID:
+            self.client.chat_postMessage(channel=Config.SUMMARY_CHANNEL_ID, text=sending_message_summary)
+        else:
+            print(sending_message_summary)
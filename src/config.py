@@ -19,10 +19,22 @@ class Config:
     AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
     # Deployment name for Azure OpenAI embedding service.
     AZURE_EMBEDDING_DEPLOYMENT_NAME = os.getenv("AZURE_EMBEDDING_DEPLOYMENT_NAME")
+    # Directory of the caches and state files written at runtime (Slack directory, LLM responses,
+    # embeddings, conversation state, scheduling links, stage model), kept out of git.
+    CACHE_DIR = os.getenv("CACHE_DIR", "./data/cache")
     # UUID for the Calendly event type, used for scheduling links.
     CALENDLY_EVENT_UUID = os.getenv("CALENDLY_EVENT_UUID")
     # API key for Calendly integration.
     CALENDLY_API_KEY = os.getenv("CALENDLY_API_KEY")
+    # Base URL of the Calendly API.
+    CALENDLY_API_URL = os.getenv("CALENDLY_API_URL", "https://api.calendly.com")
+    # Attempts of a scheduling link creation that is rate limited or fails.
+    CALENDLY_MAX_RETRIES = int(os.getenv("CALENDLY_MAX_RETRIES", 5))
+    # Single-use scheduling links kept ready, and links created at once when topping the pool up.
+    CALENDLY_POOL_WATERMARK = int(os.getenv("CALENDLY_POOL_WATERMARK", 10))
+    CALENDLY_POOL_BATCH = int(os.getenv("CALENDLY_POOL_BATCH", 5))
+    # File keeping the unused scheduling links between runs (empty disables it).
+    CALENDLY_POOL_PATH = os.getenv("CALENDLY_POOL_PATH", os.path.join(CACHE_DIR, "calendly_links.json"))
     # API key for LangChain Smith services.
     LANGCHAIN_SMITH_API_KEY = os.getenv("LANGCHAIN_SMITH_API_KEY")
     # Fixed endpoint for LangChain Smith API services.
@@ -31,3 +43,123 @@ class Config:
     LANGCHAIN_PROJECT = "EchoLink AI"
     # Enable detailed tracing for LangChain operations.
     LANGCHAIN_TRACING_V2 = "True"
+
+    # Maximum number of professionals the campaign runner talks to at the same time.
+    CAMPAIGN_MAX_CONCURRENCY = int(os.getenv("CAMPAIGN_MAX_CONCURRENCY", 50))
+    # Number of worker processes sharing the conversations of a campaign (main.py --workers).
+    CAMPAIGN_WORKERS = int(os.getenv("CAMPAIGN_WORKERS", 1))
+    # Size of the thread pool used for blocking Slack and LLM calls during a campaign.
+    CAMPAIGN_WORKER_THREADS = int(os.getenv("CAMPAIGN_WORKER_THREADS", 32))
+    # Seconds to wait between two polls of the same Slack channel.
+    SLACK_POLL_INTERVAL = float(os.getenv("SLACK_POLL_INTERVAL", 2))
+    # Minutes without any reply after which the professional is considered busy.
+    CONVERSATION_NO_RESPONSE_TIMEOUT = float(os.getenv("CONVERSATION_NO_RESPONSE_TIMEOUT", 15))
+    # Minutes after which a started but idle conversation is abandoned.
+    CONVERSATION_IDLE_TIMEOUT = float(os.getenv("CONVERSATION_IDLE_TIMEOUT", 20))
+    # Minutes after which a late reply still gets one final answer before closing.
+    CONVERSATION_LATE_REPLY_AFTER = float(os.getenv("CONVERSATION_LATE_REPLY_AFTER", 25))
+    # Minutes during which replies are handled as a regular conversation.
+    CONVERSATION_MAX_DURATION = float(os.getenv("CONVERSATION_MAX_DURATION", 30))
+    # Name of the person receiving the conversation summaries.
+    SUMMARY_RECIPIENT_NAME = os.getenv("SUMMARY_RECIPIENT_NAME", "")
+    # Slack channel ID where the conversation summaries are posted.
+    SUMMARY_CHANNEL_ID = os.getenv("SUMMARY_CHANNEL_ID")
+    # Signing secret of the Slack app, used to verify Events API requests.
+    SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
+    # How replies are received: "events" (Events API listener) or "polling" (conversations_history fallback).
+    SLACK_INGESTION_MODE = os.getenv("SLACK_INGESTION_MODE", "events" if os.getenv("SLACK_SIGNING_SECRET") else "polling")
+    # Interface and port of the local Slack Events API listener.
+    SLACK_EVENTS_HOST = os.getenv("SLACK_EVENTS_HOST", "0.0.0.0")
+    SLACK_EVENTS_PORT = int(os.getenv("SLACK_EVENTS_PORT", 3000))
+    # Accept unsigned Events API requests when no signing secret is set, for local tests only (binds 127.0.0.1).
+    SLACK_EVENTS_ALLOW_UNSIGNED = os.getenv("SLACK_EVENTS_ALLOW_UNSIGNED", "false").lower() == "true"
+    # Upper bound in seconds of the adaptive polling interval of an idle channel.
+    SLACK_POLL_MAX_INTERVAL = float(os.getenv("SLACK_POLL_MAX_INTERVAL", 30))
+    # Decide the conversation stage and write the reply in a single LLM call ("false" restores the two-chain flow).
+    COMBINED_STAGE_AND_REPLY = os.getenv("COMBINED_STAGE_AND_REPLY", "true").lower() == "true"
+    # Post replies while they are generated and refresh them with chat_update ("false" posts complete replies).
+    SLACK_STREAMING = os.getenv("SLACK_STREAMING", "true").lower() == "true"
+    # Minimum seconds between two chat_update calls on a streamed reply.
+    SLACK_STREAM_UPDATE_INTERVAL = float(os.getenv("SLACK_STREAM_UPDATE_INTERVAL", 1.0))
+    # Minimum number of new words before a streamed reply is refreshed with chat_update.
+    SLACK_STREAM_UPDATE_MIN_WORDS = int(os.getenv("SLACK_STREAM_UPDATE_MIN_WORDS", 8))
+    # Number of most recent history entries sent verbatim to the prompts, older ones are summarized (0 sends everything).
+    CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", 10))
+    # Number of history entries folded into the running summary at once.
+    CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", 4))
+    # Token budget of the history inserted into a prompt.
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 2000))
+    # Record and report the number of prompt tokens sent on every turn.
+    REPORT_PROMPT_TOKENS = os.getenv("REPORT_PROMPT_TOKENS", "true").lower() == "true"
+    # Response cache of the deterministic LLM calls: "memory", "sqlite" (persisted in LLM_CACHE_PATH) or "none".
+    LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+    # Seconds a cached response stays valid (0 keeps it until evicted).
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 86400))
+    # Maximum number of responses kept in memory.
+    LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 10000))
+    # Roster CSV of the professionals, read ROSTER_CHUNK_SIZE rows at a time (0 reads it at once).
+    ROSTER_PATH = os.getenv("ROSTER_PATH", "./data/dataset.csv")
+    ROSTER_CHUNK_SIZE = int(os.getenv("ROSTER_CHUNK_SIZE", 50000))
+    # Parquet file caching the aggregated roster between runs (empty disables it, requires pyarrow).
+    ROSTER_PARQUET_CACHE = os.getenv("ROSTER_PARQUET_CACHE", "")
+    # JSON file persisting the email to Slack user ID index of the workspace (empty disables it).
+    SLACK_USER_CACHE_PATH = os.getenv("SLACK_USER_CACHE_PATH", os.path.join(CACHE_DIR, "slack_users.json"))
+    # Seconds after which the workspace directory is reloaded from Slack.
+    SLACK_USER_CACHE_TTL = float(os.getenv("SLACK_USER_CACHE_TTL", 86400))
+    # Number of members requested per users_list page.
+    SLACK_USERS_PAGE_SIZE = int(os.getenv("SLACK_USERS_PAGE_SIZE", 200))
+    # Size of the pooled HTTP connections to the Slack API, also the maximum number of Slack requests in flight.
+    SLACK_MAX_CONNECTIONS = int(os.getenv("SLACK_MAX_CONNECTIONS", 20))
+    # Share of the workspace-wide Slack rate limits used by this process, set to 1/N in each of N campaign workers.
+    SLACK_RATE_SHARE = float(os.getenv("SLACK_RATE_SHARE", 1))
+    # Attempts of a Slack request that is rate limited or fails with a server error.
+    SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", 5))
+    # Maximum number of LLM requests in flight across the whole process.
+    LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 16))
+    # Tokens-per-minute quota of every Azure OpenAI deployment (0 disables the budget).
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+    # Completion tokens reserved in the budget for a request whose model sets no max_tokens.
+    LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", 256))
+    # Dimension of the vectors returned by the embedding deployment.
+    EMBEDDINGS_SIZE = int(os.getenv("EMBEDDINGS_SIZE", 1536))
+    # Embedding cache backend: "memory", "file" (persisted in EMBEDDING_CACHE_PATH across runs) or "none".
+    EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory").lower()
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embedding_cache.f32"))
+    # Maximum number of vectors kept in memory by the embedding cache.
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 50000))
+    # Store of the conversation state: "sqlite" (in STATE_STORE_PATH, shared by the workers of a host) or "none".
+    STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "sqlite").lower()
+    STATE_STORE_PATH = os.getenv("STATE_STORE_PATH", os.path.join(CACHE_DIR, "conversations.sqlite"))
+    # Seconds without heartbeat after which the conversations of a worker can be claimed by another one.
+    STATE_LEASE_SECONDS = float(os.getenv("STATE_LEASE_SECONDS", 120))
+    # ID of this worker in the state store, unique per process when empty. A restarted worker keeping
+    # its ID resumes its conversations without waiting for the lease to expire.
+    WORKER_ID = os.getenv("WORKER_ID", "")
+    # Directory of the persistent memory of past conversations (empty disables it).
+    MEMORY_STORE_PATH = os.getenv("MEMORY_STORE_PATH", "")
+    # Index used once the memory holds MEMORY_ANN_THRESHOLD vectors: "hnsw", "ivf" or "flat" (always exact).
+    MEMORY_INDEX_TYPE = os.getenv("MEMORY_INDEX_TYPE", "hnsw")
+    MEMORY_ANN_THRESHOLD = int(os.getenv("MEMORY_ANN_THRESHOLD", 100000))
+    # Number of inverted lists searched by an IVF memory index.
+    MEMORY_IVF_NPROBE = int(os.getenv("MEMORY_IVF_NPROBE", 16))
+    # Number of texts embedded per request when adding memories.
+    MEMORY_EMBED_BATCH = int(os.getenv("MEMORY_EMBED_BATCH", 256))
+    # Record spans around the Slack, LLM, embedding and Calendly calls of every turn.
+    INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "true").lower() == "true"
+    # File receiving one JSON line per span, labelled with its conversation (empty disables it).
+    METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "")
+    # File rewritten with the latency histograms and counters in the Prometheus text format (empty disables it).
+    METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH", "")
+    # Seconds between two rewrites of the Prometheus file during a campaign.
+    METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", 15))
+    # Decide the obvious stage transitions locally (keyword rules, then the trained model if any)
+    # and only call the LLM stage analyzer for the other turns.
+    STAGE_CLASSIFIER_ENABLED = os.getenv("STAGE_CLASSIFIER_ENABLED", "true").lower() == "true"
+    # Logistic regression model of the stage classifier, trained with main.py --train-stage-classifier.
+    STAGE_CLASSIFIER_MODEL_PATH = os.getenv("STAGE_CLASSIFIER_MODEL_PATH", os.path.join(CACHE_DIR, "stage_classifier.npz"))
+    # Minimum confidence of a stage decided locally (RULE_CONFIDENCE for the keyword rules, the
+    # probability of the predicted stage for the model), below it the LLM analyzer decides.
+    STAGE_CLASSIFIER_THRESHOLD = float(os.getenv("STAGE_CLASSIFIER_THRESHOLD", 0.9))
+    # File receiving the stages decided by the LLM, the training data of the model (empty disables it).
+    STAGE_CLASSIFIER_LOG_PATH = os.getenv("STAGE_CLASSIFIER_LOG_PATH", "")
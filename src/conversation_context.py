@@ -0,0 +1,108 @@
+from functools import lru_cache
+from config import Config
+from instrumentation import span
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """Loads the tokenizer used to count prompt tokens, None when tiktoken is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """
+    Counts the tokens of a text with the tokenizer of the GPT chat models.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Number of tokens, estimated from the text length when no tokenizer is available.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+class ConversationContextManager:
+    """
+    Keeps the conversation history sent to the prompts bounded. The last turns are kept
+    verbatim, older turns are folded into a summary maintained incrementally by a
+    summarizer chain, and a token budget is enforced before every chain call.
+    """
+
+    def __init__(self, summarizer=None, max_turns=None, max_tokens=None, summary_batch=None, token_counter=None):
+        """
+        Args:
+            summarizer (LLMChain): Chain taking "summary" and "new_lines" and returning the updated summary.
+                Without a summarizer, older turns are simply dropped.
+            max_turns (int): Number of most recent history entries kept verbatim, defaults to Config.CONTEXT_MAX_TURNS.
+            max_tokens (int): Token budget of the rendered history, defaults to Config.CONTEXT_MAX_TOKENS.
+            summary_batch (int): Number of entries folded into the summary at once, defaults to Config.CONTEXT_SUMMARY_BATCH.
+            token_counter (callable): Function counting the tokens of a text, defaults to count_tokens.
+        """
+        self.summarizer = summarizer
+        self.max_turns = max_turns if max_turns is not None else Config.CONTEXT_MAX_TURNS
+        self.max_tokens = max_tokens if max_tokens is not None else Config.CONTEXT_MAX_TOKENS
+        self.summary_batch = max(summary_batch if summary_batch is not None else Config.CONTEXT_SUMMARY_BATCH, 1)
+        self.token_counter = token_counter or count_tokens
+        self.reset()
+
+    def reset(self):
+        """Forgets the summary, used when the conversation starts over."""
+        self.summary = ''
+        self.summarized_count = 0
+        self._token_counts = {}
+
+    def render(self, history, separator="\n"):
+        """
+        Renders the history to insert into a prompt.
+
+        Args:
+            history (list): Full conversation history, oldest first.
+            separator (str): Separator placed between the entries.
+
+        Returns:
+            str: Summary of the older turns followed by the recent turns.
+        """
+        overflow = len(history) - self.summarized_count - self.max_turns
+        if overflow >= self.summary_batch:
+            self._fold(history[self.summarized_count:self.summarized_count + overflow])
+        recent = history[self.summarized_count:]
+
+        # Fold the oldest recent entries until the rendered history fits in the token budget.
+        summary_tokens = self.token_counter(self.summary) if self.summary else 0
+        tokens = summary_tokens + sum(self._count(entry) for entry in recent)
+        drop = 0
+        while tokens > self.max_tokens and drop < len(recent) - 1:
+            tokens -= self._count(recent[drop])
+            drop += 1
+        if drop:
+            self._fold(recent[:drop])
+            recent = recent[drop:]
+
+        if self.summary:
+            return separator.join([f"Summary of the earlier conversation: {self.summary}"] + recent)
+        return separator.join(recent)
+
+    def _count(self, entry):
+        """Counts the tokens of a history entry, once per distinct entry."""
+        if entry not in self._token_counts:
+            self._token_counts[entry] = self.token_counter(entry)
+        return self._token_counts[entry]
+
+    def _fold(self, entries):
+        """Moves history entries out of the verbatim window into the summary."""
+        if not entries:
+            return
+        if self.summarizer is not None:
+            with span('chain', 'conversation_summary'):
+                self.summary = self.summarizer.run(summary=self.summary, new_lines="\n".join(entries)).strip()
+        for entry in entries:
+            self._token_counts.pop(entry, None)
+        self.summarized_count += len(entries)
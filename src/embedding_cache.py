@@ -0,0 +1,230 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the file is only safe with a single writer process.
+    fcntl = None
+from langchain_core.embeddings import Embeddings
+from config import Config
+
+
+class EmbeddingFileStore:
+    """
+    Append-only file of embeddings: fixed-size records made of the 32-byte content hash
+    followed by the float32 vector. Only the hashes are read when the file is opened,
+    vectors are read through a memory map when they are looked up.
+    """
+
+    def __init__(self, path, dimension):
+        """
+        Args:
+            path (str): Path of the file.
+            dimension (int): Dimension of the stored vectors.
+        """
+        self.path = path
+        self.dimension = dimension
+        # Raw bytes rather than 'S32', which would strip the trailing zero bytes of a hash.
+        self.dtype = np.dtype([('key', 'V32'), ('vector', '<f4', (dimension,))])
+        self.rows = {}
+        self._map = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            with open(path, 'r+b') as f:
+                self._lock_file(f)
+                size = os.fstat(f.fileno()).st_size
+                if size % self.dtype.itemsize:
+                    # Record cut short by an interrupted write.
+                    f.truncate(size - size % self.dtype.itemsize)
+            if size >= self.dtype.itemsize:
+                keys = np.memmap(path, dtype=self.dtype, mode='r')['key']
+                self.rows = {key: row for row, key in enumerate(keys.tolist())}
+
+    @staticmethod
+    def _lock_file(f):
+        """Locks a file exclusively until it is closed."""
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key):
+        """Returns the vector (float32 array) stored under a hash, None when absent."""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._map is None or row >= len(self._map):
+            self._map = np.memmap(self.path, dtype=self.dtype, mode='r')
+        return np.array(self._map[row]['vector'])
+
+    def put_many(self, items):
+        """Appends (hash, vector) pairs, skipping hashes already stored and vectors of another dimension."""
+        records = [(key, vector) for key, vector in items if key not in self.rows and len(vector) == self.dimension]
+        if not records:
+            return
+        array = np.empty(len(records), dtype=self.dtype)
+        for i, (key, vector) in enumerate(records):
+            array[i] = (key, vector)
+        with open(self.path, 'ab') as f:
+            # Other processes append to the same file: the rows are numbered from its size
+            # under an exclusive lock held until the records are written.
+            self._lock_file(f)
+            first_row = os.fstat(f.fileno()).st_size // self.dtype.itemsize
+            f.write(array.tobytes())
+            f.flush()
+        for i, (key, _) in enumerate(records):
+            self.rows[key] = first_row + i
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings: vectors are keyed on a hash of the model and the
+    exact text, kept in an in-memory LRU and optionally in an EmbeddingFileStore so they
+    survive restarts. Hits, misses and the embedding requests sent are counted for reporting.
+    """
+
+    def __init__(self, maxsize=None, path=None, dimension=None):
+        """
+        Args:
+            maxsize (int): Maximum number of vectors kept in memory, defaults to Config.EMBEDDING_CACHE_SIZE.
+            path (str): Path of the file backing the cache, memory only when None.
+            dimension (int): Dimension of the vectors persisted, defaults to Config.EMBEDDINGS_SIZE.
+        """
+        self.maxsize = maxsize if maxsize is not None else Config.EMBEDDING_CACHE_SIZE
+        self.store = EmbeddingFileStore(path, dimension or Config.EMBEDDINGS_SIZE) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace, text):
+        """Builds the cache key of a text embedded by a model."""
+        return hashlib.sha256(f"{namespace}\x00{text}".encode()).digest()
+
+    def lookup(self, keys):
+        """Returns the cached vector (float32 array) of every key, None for the misses."""
+        vectors = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None and self.store is not None:
+                    vector = self.store.get(key)
+                    if vector is not None:
+                        self._store(key, vector)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                vectors.append(vector)
+        return vectors
+
+    def update(self, items):
+        """Stores (key, vector) pairs returned by one embedding request."""
+        # float32 arrays take 4 bytes per dimension, Python lists of floats about 32.
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items]
+        with self._lock:
+            self.requests += 1
+            for key, vector in items:
+                self._store(key, vector)
+            if self.store is not None:
+                self.store.put_many(items)
+
+    def _store(self, key, vector):
+        """Adds a vector to the in-memory LRU, evicting the least recently used ones."""
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of hits and misses, hit rate, embedding requests sent and number of vectors in memory.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'requests': self.requests,
+            'size': len(self._entries),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings model answering the texts it has already embedded from an EmbeddingCache and
+    sending the others, without duplicates, to the wrapped model in a single request.
+    """
+
+    def __init__(self, embeddings, cache, namespace):
+        """
+        Args:
+            embeddings (Embeddings): Model computing the vectors missing from the cache.
+            cache (EmbeddingCache): Cache of the vectors.
+            namespace (str): Identifies the model in the cache keys, such as its deployment name.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.namespace = namespace
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.make_key(self.namespace, text) for text in texts]
+        vectors = self.cache.lookup(keys)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.update(list(computed.items()))
+            return [computed[key] if vector is None else vector.tolist() for key, vector in zip(keys, vectors)]
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache configured by Config.EMBEDDING_CACHE_BACKEND
+    ("memory", "file" or "none"), None when caching is disabled.
+    """
+    global _embedding_cache
+    if Config.EMBEDDING_CACHE_BACKEND == 'none':
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            path = Config.EMBEDDING_CACHE_PATH if Config.EMBEDDING_CACHE_BACKEND == 'file' else None
+            _embedding_cache = EmbeddingCache(path=path)
+        return _embedding_cache
+
+
+def with_embedding_cache(embeddings, namespace, cache=None):
+    """
+    Wraps an embeddings model so that texts it has already embedded are answered from the cache.
+
+    Args:
+        embeddings (Embeddings): Model to wrap.
+        namespace (str): Identifies the model in the cache keys.
+        cache (EmbeddingCache): Cache to use, defaults to get_embedding_cache().
+
+    Returns:
+        Embeddings: The cached model, or the model itself when caching is disabled.
+    """
+    cache = cache or get_embedding_cache()
+    if cache is None:
+        return embeddings
+    return CachedEmbeddings(embeddings, cache, namespace)
@@ -0,0 +1,221 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+from langchain_core.embeddings import Embeddings
+from config import Config
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Conversation the current code runs for, set by the campaign for every conversation task.
+current_conversation = contextvars.ContextVar('current_conversation', default=None)
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Span:
+    """Timed operation of a turn; attributes such as tokens, retries or queue_wait are set with set()."""
+
+    __slots__ = ('kind', 'name', 'conversation', 'start', 'attributes', 'error')
+
+    def __init__(self, kind, name, conversation):
+        self.kind = kind
+        self.name = name
+        self.conversation = conversation
+        self.start = time.time()
+        self.attributes = {}
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Instrumentation:
+    """
+    Records spans around the Slack, LLM, embedding and Calendly calls of every turn: latency
+    and queue wait histograms and token, retry and error counters by kind and name, exported
+    in the Prometheus text format, and every span with its conversation as a JSON line.
+    """
+
+    def __init__(self, jsonl_path=None, prometheus_path=None, enabled=None):
+        """
+        Args:
+            jsonl_path (str): File receiving one JSON line per span, defaults to Config.METRICS_JSONL_PATH (disabled when empty).
+            prometheus_path (str): File rewritten by export() in the Prometheus text format,
+                defaults to Config.METRICS_PROMETHEUS_PATH (disabled when empty).
+            enabled (bool): Record the spans, defaults to Config.INSTRUMENTATION_ENABLED.
+        """
+        self.jsonl_path = jsonl_path if jsonl_path is not None else Config.METRICS_JSONL_PATH
+        self.prometheus_path = prometheus_path if prometheus_path is not None else Config.METRICS_PROMETHEUS_PATH
+        self.enabled = enabled if enabled is not None else Config.INSTRUMENTATION_ENABLED
+        self.latency = {}
+        self.queue_wait = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._jsonl = None
+
+    @contextmanager
+    def span(self, kind, name):
+        """
+        Times the enclosed block as a span of the current conversation.
+
+        Args:
+            kind (str): Kind of operation: "slack", "chain", "llm", "embedding", "calendly", ...
+            name (str): Operation of that kind, such as the API method or the chain.
+
+        Yields:
+            Span: Span whose attributes can be set by the block, None when instrumentation is disabled.
+        """
+        if not self.enabled:
+            yield None
+            return
+        span = Span(kind, name, current_conversation.get())
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            self.record(span, time.perf_counter() - started)
+
+    def record(self, span, duration):
+        """Adds a finished span to the metrics and the JSON-lines output."""
+        key = (span.kind, span.name)
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(duration)
+            if 'queue_wait' in span.attributes:
+                self.queue_wait.setdefault(key, Histogram()).observe(span.attributes['queue_wait'])
+            for attribute in ('prompt_tokens', 'completion_tokens', 'retries', 'texts'):
+                if span.attributes.get(attribute):
+                    self._add(attribute, key, span.attributes[attribute])
+            if span.error is not None:
+                self._add('errors', key, 1)
+            if self.jsonl_path:
+                if self._jsonl is None:
+                    self._jsonl = open(self.jsonl_path, 'a', buffering=1)
+                self._jsonl.write(json.dumps(dict(
+                    ts=round(span.start, 6), conversation=span.conversation, kind=span.kind, name=span.name,
+                    duration=round(duration, 6), error=span.error, **span.attributes)) + '\n')
+
+    def observe_queue_wait(self, kind, name, seconds):
+        """Records the time a call waited for a worker or a connection, outside of any span."""
+        if self.enabled:
+            with self._lock:
+                self.queue_wait.setdefault((kind, name), Histogram()).observe(seconds)
+
+    def count(self, counter, kind, name, value=1):
+        """Adds to a counter outside of any span, such as the tokens billed for a request."""
+        if self.enabled:
+            with self._lock:
+                self._add(counter, (kind, name), value)
+
+    def _add(self, counter, key, value):
+        self.counters[(counter,) + key] = self.counters.get((counter,) + key, 0) + value
+
+    def prometheus_text(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric, histograms, help_text in [
+                ('echolink_span_seconds', self.latency, 'Latency of the instrumented calls.'),
+                ('echolink_queue_wait_seconds', self.queue_wait, 'Time spent waiting for a rate limit, a connection or a worker.'),
+            ]:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for (kind, name), histogram in sorted(histograms.items()):
+                    labels = f'kind="{kind}",name="{name}"'
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum:.6f}')
+                    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+            names = sorted({key[0] for key in self.counters})
+            for counter in names:
+                metric = f"echolink_{counter}_total"
+                lines += [f"# HELP {metric} {counter.replace('_', ' ').capitalize()} of the instrumented calls.", f"# TYPE {metric} counter"]
+                for (c, kind, name), value in sorted(self.counters.items()):
+                    if c == counter:
+                        lines.append(f'{metric}{{kind="{kind}",name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Rewrites the Prometheus file, for a node exporter textfile collector or a later look."""
+        if not self.prometheus_path:
+            return
+        tmp_path = self.prometheus_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.prometheus_path)
+
+    def summary(self):
+        """
+        Returns:
+            list: (kind, name, calls, mean seconds, total seconds) of every span, slowest total first.
+        """
+        with self._lock:
+            rows = [(kind, name, h.count, h.sum / h.count, h.sum) for (kind, name), h in self.latency.items()]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Embeddings model recording a span for every request sent to the wrapped model."""
+
+    def __init__(self, embeddings, name, instrumentation=None):
+        """
+        Args:
+            embeddings (Embeddings): Model to wrap.
+            name (str): Name of the spans, such as the deployment.
+            instrumentation (Instrumentation): Recorder of the spans, defaults to get_instrumentation().
+        """
+        self.embeddings = embeddings
+        self.name = name
+        self.instrumentation = instrumentation or get_instrumentation()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.instrumentation.span('embedding', self.name) as span:
+            if span is not None:
+                span.set(texts=len(texts))
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.instrumentation.span('embedding', self.name) as span:
+            if span is not None:
+                span.set(texts=1)
+            return self.embeddings.embed_query(text)
+
+
+_instrumentation = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation():
+    """Returns the instrumentation shared by the process."""
+    global _instrumentation
+    with _instrumentation_lock:
+        if _instrumentation is None:
+            _instrumentation = Instrumentation()
+        return _instrumentation
+
+
+def span(kind, name):
+    """Shortcut for get_instrumentation().span(kind, name)."""
+    return get_instrumentation().span(kind, name)
@@ -0,0 +1,176 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from config import Config
+
+# Whitespace, including the escaped newlines of serialized chat messages, is collapsed so
+# prompts differing only in indentation or line breaks share a cache entry.
+_WHITESPACE_PATTERN = re.compile(r'(?:\s|\\n|\\r|\\t)+')
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Cache of LLM responses keyed on the model, its parameters and the normalized prompt.
+    Entries live in an in-memory LRU, optionally backed by a SQLite file so they survive
+    restarts, and expire after a TTL. Hits and misses are counted for reporting.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, sqlite_path=None):
+        """
+        Args:
+            maxsize (int): Maximum number of entries kept in memory, defaults to Config.LLM_CACHE_SIZE.
+            ttl (float): Seconds an entry stays valid, defaults to Config.LLM_CACHE_TTL (0 never expires).
+            sqlite_path (str): Path of the SQLite file backing the cache, memory only when None.
+        """
+        self.maxsize = maxsize if maxsize is not None else Config.LLM_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.LLM_CACHE_TTL
+        self.sqlite_path = sqlite_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if sqlite_path:
+            os.makedirs(os.path.dirname(sqlite_path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+            self.sweep()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Builds the cache key of a prompt sent to a model configuration."""
+        normalized = _WHITESPACE_PATTERN.sub(' ', prompt).strip()
+        return hashlib.sha256(f"{llm_string}\x00{normalized}".encode()).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Returns the cached generations of a prompt, None on a miss."""
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._connection is not None:
+                row = self._connection.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._expired(row[1]):
+                    self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._connection.commit()
+                elif row is not None:
+                    entry = ([loads(g) for g in json.loads(row[0])], row[1])
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Stores the generations returned for a prompt."""
+        key = self.make_key(prompt, llm_string)
+        created_at = time.time()
+        with self._lock:
+            self._store(key, (return_val, created_at))
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps([dumps(g) for g in return_val]), created_at)
+                )
+                self._connection.commit()
+
+    def _store(self, key, entry):
+        """Adds an entry to the in-memory LRU, evicting the least recently used ones."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def sweep(self):
+        """Deletes the expired entries from memory and from the SQLite file."""
+        if not self.ttl:
+            return
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if self._expired(entry[1])]:
+                del self._entries[key]
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+                self._connection.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        """Removes every entry."""
+        with self._lock:
+            self._entries.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM llm_cache")
+                self._connection.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of hits and misses, hit rate and number of entries in memory.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+        }
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Returns the process-wide response cache configured by Config.LLM_CACHE_BACKEND
+    ("memory", "sqlite" or "none"), None when caching is disabled.
+    """
+    global _llm_cache
+    if Config.LLM_CACHE_BACKEND == 'none':
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            sqlite_path = Config.LLM_CACHE_PATH if Config.LLM_CACHE_BACKEND == 'sqlite' else None
+            _llm_cache = LLMResponseCache(sqlite_path=sqlite_path)
+        return _llm_cache
+
+
+def with_response_cache(llm, cache=None):
+    """
+    Returns a copy of a chat model answering identical prompts from the response cache.
+    Only models with a temperature of 0 are cached: the output of a sampling model would
+    be frozen to its first answer.
+
+    Args:
+        llm: Chat model to wrap, possibly a ManagedChatModel around the actual model.
+        cache (BaseCache): Cache to use, defaults to get_llm_cache().
+
+    Returns:
+        The cached copy of the model, or the model itself when caching is disabled or the model samples.
+    """
+    cache = cache or get_llm_cache()
+    if cache is None or getattr(llm, 'cache', None) is cache:
+        return llm
+    if getattr(getattr(llm, 'llm', llm), 'temperature', None) != 0:
+        return llm
+    # copy.copy rather than BaseModel.copy, which drops the fields excluded from serialization such as callbacks.
+    cached_llm = copy.copy(llm)
+    cached_llm.cache = cache
+    return cached_llm
@@ -0,0 +1,264 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from config import Config
+from conversation_context import count_tokens
+from instrumentation import get_instrumentation
+
+
+class TokenBudget:
+    """Tokens-per-minute budget of a deployment, over a sliding one minute window."""
+
+    def __init__(self, tokens_per_minute):
+        self.limit = tokens_per_minute
+        self.used = 0
+        self._window = deque()
+
+    def _expire(self, now):
+        while self._window and now - self._window[0][0] >= 60:
+            self.used -= self._window.popleft()[1]
+
+    async def reserve(self, tokens):
+        """
+        Waits until the tokens fit in the budget of the last minute and reserves them.
+
+        Returns:
+            list: Reservation to pass to settle() once the actual usage is known.
+        """
+        tokens = min(tokens, self.limit)
+        while True:
+            now = time.monotonic()
+            self._expire(now)
+            if self.used + tokens <= self.limit:
+                reservation = [now, tokens]
+                self._window.append(reservation)
+                self.used += tokens
+                return reservation
+            await asyncio.sleep(self._window[0][0] + 60 - now)
+
+    def settle(self, reservation, tokens):
+        """Replaces the estimate of a reservation with the tokens actually used."""
+        if any(r is reservation for r in self._window):
+            self.used += tokens - reservation[1]
+        reservation[1] = tokens
+
+
+class LLMExecutor:
+    """
+    Runs every LLM request of the process on a dedicated event loop, so requests are sent
+    with the async clients whether they come from a chain called synchronously in a worker
+    thread or from an async caller. A global semaphore bounds the requests in flight, each
+    deployment gets a tokens-per-minute budget, and identical concurrent requests are
+    coalesced into a single call.
+    """
+
+    def __init__(self, max_in_flight=None, tokens_per_minute=None, completion_tokens=None):
+        """
+        Args:
+            max_in_flight (int): Maximum number of concurrent LLM requests, defaults to Config.LLM_MAX_IN_FLIGHT.
+            tokens_per_minute (int): Budget of every deployment, defaults to Config.LLM_TOKENS_PER_MINUTE (0 is unlimited).
+            completion_tokens (int): Completion tokens reserved for a request whose model sets no max_tokens,
+                defaults to Config.LLM_COMPLETION_TOKENS_ESTIMATE.
+        """
+        self.max_in_flight = max_in_flight or Config.LLM_MAX_IN_FLIGHT
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else Config.LLM_TOKENS_PER_MINUTE
+        self.completion_tokens = completion_tokens or Config.LLM_COMPLETION_TOKENS_ESTIMATE
+        self.stats = Counter()
+        self.budgets = {}
+        self._pending = {}
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        """Starts the event loop thread on first use."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-executor', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro):
+        """Schedules a coroutine on the executor loop and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run(self, coro):
+        """Runs a coroutine on the executor loop, blocking the calling thread until it completes."""
+        return self.submit(coro).result()
+
+    async def arun(self, coro):
+        """Runs a coroutine on the executor loop from another event loop."""
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def wrap(self, llm):
+        """Returns a chat model sending the requests of llm through this executor."""
+        return ManagedChatModel(llm=llm, executor=self)
+
+    def _in_flight(self):
+        """Returns the global semaphore, created on the executor loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    @staticmethod
+    def _deployment(llm):
+        return getattr(llm, 'deployment_name', None) or getattr(llm, 'model_name', None) or llm._llm_type
+
+    def _budget(self, llm):
+        if not self.tokens_per_minute:
+            return None
+        deployment = self._deployment(llm)
+        if deployment not in self.budgets:
+            self.budgets[deployment] = TokenBudget(self.tokens_per_minute)
+        return self.budgets[deployment]
+
+    def _estimate_tokens(self, llm, messages):
+        completion = getattr(llm, 'max_tokens', None) or self.completion_tokens
+        return count_tokens("\n".join(str(m.content) for m in messages)) + completion
+
+    async def generate(self, llm, messages, stop=None, **kwargs):
+        """
+        Sends a request, or waits for the identical request already in flight.
+
+        Args:
+            llm (BaseChatModel): Model sending the request.
+            messages (list): Prompt messages.
+            stop (list): Stop sequences.
+
+        Returns:
+            ChatResult: Result of the request.
+        """
+        key = (id(llm), tuple((m.type, str(m.content)) for m in messages), tuple(stop or ()), repr(sorted(kwargs.items())))
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        instrumentation = get_instrumentation()
+        deployment = self._deployment(llm)
+        try:
+            waiting = time.perf_counter()
+            budget = self._budget(llm)
+            reservation = await budget.reserve(self._estimate_tokens(llm, messages)) if budget else None
+            async with self._in_flight():
+                instrumentation.observe_queue_wait('llm', deployment, time.perf_counter() - waiting)
+                self.stats['requests'] += 1
+                result = await llm._agenerate(messages, stop=stop, **kwargs)
+            token_usage = (result.llm_output or {}).get('token_usage', {})
+            usage = token_usage.get('total_tokens')
+            if reservation is not None and usage:
+                budget.settle(reservation, usage)
+            for counter in ('prompt_tokens', 'completion_tokens'):
+                if token_usage.get(counter):
+                    instrumentation.count(counter, 'llm', deployment, token_usage[counter])
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks the exception as retrieved when no other caller was waiting for it.
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    async def stream(self, llm, messages, stop=None, **kwargs):
+        """
+        Streams the chunks of a request, holding an in-flight slot until the last one or until
+        the stream is closed or cancelled, when the reservation in the token budget is settled
+        with the prompt and the tokens actually streamed.
+        """
+        waiting = time.perf_counter()
+        budget = self._budget(llm)
+        reservation = await budget.reserve(self._estimate_tokens(llm, messages)) if budget else None
+        streamed = []
+        try:
+            async with self._in_flight():
+                get_instrumentation().observe_queue_wait('llm', self._deployment(llm), time.perf_counter() - waiting)
+                self.stats['requests'] += 1
+                self.stats['streams'] += 1
+                async for chunk in llm._astream(messages, stop=stop, **kwargs):
+                    streamed.append(chunk.text)
+                    yield chunk
+        finally:
+            if reservation is not None:
+                prompt = count_tokens("\n".join(str(m.content) for m in messages))
+                budget.settle(reservation, prompt + count_tokens(''.join(streamed)))
+
+
+_STREAM_END = object()
+
+
+class ManagedChatModel(BaseChatModel):
+    """Chat model delegating to another one through an LLMExecutor."""
+
+    llm: BaseChatModel
+    executor: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self):
+        return self.llm._identifying_params
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return self.executor.run(self.executor.generate(self.llm, messages, stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return await self.executor.arun(self.executor.generate(self.llm, messages, stop, **kwargs))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.executor.stream(self.llm, messages, stop, **kwargs):
+                    chunks.put(chunk)
+                chunks.put(_STREAM_END)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                chunks.put(e)
+
+        future = self.executor.submit(pump())
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _STREAM_END:
+                    return
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            # The caller may stop reading early (end of the turn or of the conversation): the
+            # provider stream is cancelled, releasing its in-flight slot and settling its tokens.
+            future.cancel()
+
+
+_llm_executor = None
+_llm_executor_lock = threading.Lock()
+
+
+def get_llm_executor():
+    """Returns the LLM executor shared by the whole process."""
+    global _llm_executor
+    with _llm_executor_lock:
+        if _llm_executor is None:
+            _llm_executor = LLMExecutor()
+        return _llm_executor
@@ -0,0 +1,94 @@
+import threading
+from config import Config
+from llm_executor import get_llm_executor
+
+
+class Registry:
+    """
+    Process-wide registry of shared, lazily built objects. Each entry is built by its
+    factory on first use, then the same instance is returned to every caller.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        """
+        Registers the factory of an entry, replacing any instance already built.
+
+        Args:
+            name (str): Name of the entry.
+            factory (callable): Function without arguments building the entry.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name, factory=None):
+        """
+        Returns an entry, building it on first use.
+
+        Args:
+            name: Name of the entry.
+            factory (callable): Factory used when the entry has not been registered.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                build = self._factories.get(name, factory)
+                if build is None:
+                    raise KeyError(f"No factory registered for {name!r}")
+                self._instances[name] = build()
+            return self._instances[name]
+
+    def reset(self):
+        """Drops every instance built so far."""
+        with self._lock:
+            self._instances.clear()
+
+
+registry = Registry()
+
+
+def azure_chat_model(temperature):
+    """
+    Returns a factory of an Azure OpenAI chat model sending its requests through the
+    shared LLM executor. The langchain client is only imported when the model is built.
+    """
+    def build():
+        from langchain_community.chat_models import AzureChatOpenAI
+        return get_llm_executor().wrap(AzureChatOpenAI(
+            openai_api_version=Config.AZURE_OPENAI_API_VERSION,
+            azure_deployment=Config.AZURE_OPENAI_DEPLOYMENT_NAME,
+            temperature=temperature,
+        ))
+    return build
+
+
+# Model driving the conversations, and deterministic model used for the post-conversation analysis.
+registry.register('llm', azure_chat_model(0.2))
+registry.register('llm_lucas', azure_chat_model(0))
+
+
+def get_llm(name='llm'):
+    """Returns the shared chat model registered under a name ("llm" or "llm_lucas")."""
+    return registry.get(name)
+
+
+def get_chain(chain_class, llm, verbose=False):
+    """
+    Returns the chain of a class built for a model, shared by every caller. Chains only hold
+    a prompt and a model, so a single instance serves all the conversations.
+
+    Args:
+        chain_class: LLMChain subclass providing from_llm(llm, verbose).
+        llm: Model of the chain.
+        verbose (bool): Verbosity of the chain.
+    """
+    # The model itself is part of the entry so its id cannot be reused by another model.
+    entry = registry.get((chain_class, id(llm), verbose), lambda: (llm, chain_class.from_llm(llm, verbose=verbose)))
+    return entry[1]
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from config import Config
+
+
+class MemoryStore:
+    """
+    Persistent memory of past interactions shared by every conversation and campaign.
+    Documents are embedded in batches and added incrementally to a single FAISS index,
+    saved in a directory with the documents and their metadata, and memory-mapped when
+    loaded. The index starts exact (flat) and is rebuilt as an IVF or HNSW index once it
+    holds ann_threshold vectors. Searches can be restricted to the memories of one professional.
+    """
+
+    INDEX_FILE = 'index.faiss'
+    DOCUMENTS_FILE = 'documents.jsonl'
+
+    def __init__(self, embeddings, path=None, index_type=None, ann_threshold=None, batch_size=None, dimension=None, mmap=True):
+        """
+        Args:
+            embeddings (Embeddings): Model embedding the documents and queries.
+            path (str): Directory where the store is saved, None keeps it in memory only.
+            index_type (str): "flat", "ivf" or "hnsw", defaults to Config.MEMORY_INDEX_TYPE.
+            ann_threshold (int): Number of vectors from which an ivf/hnsw index replaces the flat one,
+                defaults to Config.MEMORY_ANN_THRESHOLD.
+            batch_size (int): Number of texts embedded per request, defaults to Config.MEMORY_EMBED_BATCH.
+            dimension (int): Dimension of the embeddings, defaults to Config.EMBEDDINGS_SIZE.
+            mmap (bool): Memory-map the saved index instead of reading it into memory.
+        """
+        self.embeddings = embeddings
+        self.path = path
+        self.index_type = (index_type or Config.MEMORY_INDEX_TYPE).lower()
+        self.ann_threshold = ann_threshold or Config.MEMORY_ANN_THRESHOLD
+        self.batch_size = batch_size or Config.MEMORY_EMBED_BATCH
+        self.dimension = dimension or Config.EMBEDDINGS_SIZE
+        self.documents = []
+        self.ids_by_professional = {}
+        self._saved_count = 0
+        self._rewrite_documents = False
+        self._lock = threading.RLock()
+        self._read_only = False
+        self.index = None
+        if path and os.path.exists(os.path.join(path, self.INDEX_FILE)):
+            self._load(mmap)
+        else:
+            self.index = faiss.IndexFlatL2(self.dimension)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def _load(self, mmap):
+        """Reads the saved index and documents, ignoring documents added after the last index save."""
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        self.index = faiss.read_index(os.path.join(self.path, self.INDEX_FILE), flags)
+        # Memory-mapped inverted lists are read-only: read into memory before the first add.
+        self._read_only = mmap and faiss.try_extract_index_ivf(self.index) is not None
+        self.dimension = self.index.d
+        with open(os.path.join(self.path, self.DOCUMENTS_FILE)) as f:
+            for line in f:
+                if len(self.documents) == self.index.ntotal:
+                    # Documents written by a save interrupted before the index: rewritten on the next save.
+                    self._rewrite_documents = True
+                    break
+                self._register(json.loads(line))
+        self._saved_count = len(self.documents)
+        self._prepare_index()
+
+    def _register(self, record):
+        doc_id = len(self.documents)
+        self.documents.append(record)
+        professional = record['metadata'].get('professional')
+        if professional is not None:
+            self.ids_by_professional.setdefault(professional, []).append(doc_id)
+
+    def _prepare_index(self):
+        """Enables the id lookups used by filtered searches on an IVF index."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.make_direct_map()
+            ivf.nprobe = Config.MEMORY_IVF_NPROBE
+
+    def _maybe_upgrade(self):
+        """Replaces the flat index by an approximate one once it holds ann_threshold vectors."""
+        if self.index_type == 'flat' or not isinstance(self.index, faiss.IndexFlat) or self.index.ntotal < self.ann_threshold:
+            return
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        if self.index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(self.dimension, 32)
+        else:
+            nlist = int(4 * np.sqrt(len(vectors)))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(self.dimension), self.dimension, nlist)
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+            index.train(sample)
+        index.add(vectors)
+        self.index = index
+        self._prepare_index()
+
+    def add_texts(self, texts, professional=None, metadatas=None):
+        """
+        Embeds texts in batches and adds them to the store.
+
+        Args:
+            texts (list): Texts to remember.
+            professional (str): Email of the professional the texts relate to.
+            metadatas (list): Metadata of every text.
+
+        Returns:
+            list: IDs of the added documents.
+        """
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.embeddings.embed_documents(texts[start:start + self.batch_size]))
+        return self.add_embeddings(vectors, texts, professional, metadatas)
+
+    def add_embeddings(self, vectors, texts, professional=None, metadatas=None):
+        """
+        Adds already embedded texts to the store.
+
+        Args:
+            vectors: Embeddings of the texts, one row per text.
+            texts (list): Texts to remember.
+            professional (str): Email of the professional the texts relate to.
+            metadatas (list): Metadata of every text.
+
+        Returns:
+            list: IDs of the added documents.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        now = time.time()
+        with self._lock:
+            first_id = len(self.documents)
+            for i, text in enumerate(texts):
+                metadata = dict(metadatas[i]) if metadatas else {}
+                metadata.setdefault('created_at', now)
+                if professional is not None:
+                    metadata['professional'] = professional
+                self._register({'text': text, 'metadata': metadata})
+            if self._read_only:
+                self.index = faiss.read_index(os.path.join(self.path, self.INDEX_FILE))
+                self._read_only = False
+                self._prepare_index()
+            self.index.add(vectors)
+            self._maybe_upgrade()
+            return list(range(first_id, len(self.documents)))
+
+    def search(self, query, k=4, professional=None):
+        """
+        Retrieves the memories closest to a query.
+
+        Args:
+            query (str): Text to search for.
+            k (int): Number of memories to return.
+            professional (str): Only search the memories of this professional.
+
+        Returns:
+            list: (Document, squared L2 distance) pairs, closest first.
+        """
+        return self.search_by_vector(self.embeddings.embed_query(query), k, professional)
+
+    def search_by_vector(self, vector, k=4, professional=None):
+        """Retrieves the memories closest to an embedding, see search()."""
+        query = np.asarray(vector, dtype='float32').reshape(1, -1)
+        with self._lock:
+            if professional is None:
+                distances, ids = self.index.search(query, k)
+                hits = [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i >= 0]
+            else:
+                hits = self._search_subset(query[0], self.ids_by_professional.get(professional, []), k)
+            return [(self._document(i), d) for i, d in hits]
+
+    def _search_subset(self, query, ids, k):
+        """Exact search among the given documents, whatever the index type."""
+        if not ids:
+            return []
+        ids = np.asarray(ids, dtype='int64')
+        distances = ((self.index.reconstruct_batch(ids) - query) ** 2).sum(axis=1)
+        if len(ids) > k:
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(distances[top])]
+        return [(int(ids[i]), float(distances[i])) for i in top]
+
+    def _document(self, doc_id):
+        record = self.documents[doc_id]
+        return Document(page_content=record['text'], metadata=dict(record['metadata'], id=doc_id))
+
+    def documents_of(self, professional):
+        """Returns every memory of a professional, oldest first."""
+        with self._lock:
+            return [self._document(i) for i in self.ids_by_professional.get(professional, [])]
+
+    def save(self):
+        """Writes the index and appends the documents added since the last save."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            index_path = os.path.join(self.path, self.INDEX_FILE)
+            start = 0 if self._rewrite_documents else self._saved_count
+            with open(os.path.join(self.path, self.DOCUMENTS_FILE), 'w' if self._rewrite_documents else 'a') as f:
+                for record in self.documents[start:]:
+                    f.write(json.dumps(record) + '\n')
+            self._rewrite_documents = False
+            faiss.write_index(self.index, index_path + '.tmp')
+            os.replace(index_path + '.tmp', index_path)
+            self._saved_count = len(self.documents)
+
+
+_memory_store = None
+_memory_store_lock = threading.Lock()
+
+
+def get_memory_store():
+    """
+    Returns the memory store shared by the process, saved in Config.MEMORY_STORE_PATH,
+    or None when no path is configured.
+    """
+    global _memory_store
+    if not Config.MEMORY_STORE_PATH:
+        return None
+    with _memory_store_lock:
+        if _memory_store is None:
+            from utils import create_embeddings_model
+            _memory_store = MemoryStore(create_embeddings_model(), Config.MEMORY_STORE_PATH)
+        return _memory_store
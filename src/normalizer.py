@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+import emoji
+
+# Slack shortcodes that differ from the names used by the emoji package.
+SLACK_EMOJI_ALIASES = {
+    'blush': 'smiling_face_with_smiling_eyes',
+    'wave': 'waving_hand',
+    '+1': 'thumbs_up',
+    'star2': 'glowing_star',
+    'bulb': 'light_bulb',
+    'tada': 'party_popper',
+    'smile': 'grinning_face_with_smiling_eyes',
+    'smiley': 'grinning_face_with_big_eyes',
+    'sweat_smile': 'grinning_face_with_sweat',
+    'grinning': 'grinning_face',
+    'point_right': 'backhand_index_pointing_right',
+    'raised_hands': 'raising_hands',
+    'female-technologist': 'woman_technologist',
+    'male-technologist': 'man_technologist',
+    'hugging_face': 'smiling_face_with_open_hands',
+    'one': 'keycap_1',
+    'two': 'keycap_2',
+    'mag_right': 'magnifying_glass_tilted_right',
+    'mortar_board': 'graduation_cap',
+    'female-student': 'woman_student',
+}
+
+# Skin tone modifiers Slack appends to a shortcode, e.g. ":+1::skin-tone-2:".
+SLACK_SKIN_TONES = {
+    'skin-tone-2': '\U0001F3FB',
+    'skin-tone-3': '\U0001F3FC',
+    'skin-tone-4': '\U0001F3FD',
+    'skin-tone-5': '\U0001F3FE',
+    'skin-tone-6': '\U0001F3FF',
+}
+
+# HTML entities Slack escapes in message text.
+SLACK_ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>'}
+
+# One pattern matching every token the normalizer rewrites: emoji shortcodes,
+# escaped entities and the angle brackets of Slack link/mention markup.
+_TOKEN_PATTERN = re.compile(r':([a-zA-Z0-9_+\-]+):|&(amp|lt|gt);|[<>]')
+
+
+@lru_cache(maxsize=None)
+def resolve_shortcode(name):
+    """
+    Resolves a Slack emoji shortcode to its unicode character.
+
+    Args:
+        name (str): Shortcode without the surrounding colons.
+
+    Returns:
+        str or None: The emoji, or None if the shortcode is unknown.
+    """
+    if name in SLACK_SKIN_TONES:
+        return SLACK_SKIN_TONES[name]
+    token = f":{SLACK_EMOJI_ALIASES.get(name, name)}:"
+    resolved = emoji.emojize(token)
+    if resolved == token:
+        resolved = emoji.emojize(f":{name}:", language='alias')
+    if resolved == f":{name}:":
+        return None
+    return resolved
+
+
+def _replace_token(match):
+    """Returns the replacement of a single token matched by _TOKEN_PATTERN."""
+    shortcode, entity = match.group(1), match.group(2)
+    if shortcode is not None:
+        resolved = resolve_shortcode(shortcode)
+        return resolved if resolved is not None else match.group(0)
+    if entity is not None:
+        return SLACK_ENTITIES[entity]
+    return ''
+
+
+@lru_cache(maxsize=4096)
+def normalize_slack_text(text):
+    """
+    Converts a Slack message into plain text in a single pass: emoji shortcodes become
+    unicode emoji, escaped entities are unescaped and link/mention brackets are dropped.
+    Results are memoized since the same texts come back on every poll.
+
+    Args:
+        text (str): Raw message text as returned by Slack.
+
+    Returns:
+        str: Normalized message text.
+    """
+    return _TOKEN_PATTERN.sub(_replace_token, text)
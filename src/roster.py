@@ -0,0 +1,152 @@
+import os
+import pandas as pd
+from config import Config
+
+# Columns identifying a professional and the training columns aggregated into lists.
+ROSTER_GROUP_COLUMNS = ['USER_ID', 'FIRST_NAME', 'LAST_NAME', 'EMAIL', 'TRAINING', 'PRODUCT_NAME_USED', 'RECOMMENDATION', 'FEEDBACK']
+ROSTER_LIST_COLUMNS = ['TRAINING_COMPLETED', 'TRAINING_IN_PROGRESS', 'TRAINING_NOT_STARTED']
+
+
+def _aggregate(df, groups):
+    """
+    Adds the rows of a dataframe to the aggregated professionals, collecting the training
+    columns into lists. Rows are grouped by index arrays rather than a per-group aggregate
+    callback, which is the slow part of groupby(...).aggregate(list).
+
+    Args:
+        df (DataFrame): Roster rows.
+        groups (dict): Aggregated records keyed by the values of ROSTER_GROUP_COLUMNS, updated in place.
+    """
+    columns = {c: df[c].to_numpy() for c in ROSTER_LIST_COLUMNS}
+    for key, index in df.groupby(ROSTER_GROUP_COLUMNS, sort=False).indices.items():
+        record = groups.get(key)
+        if record is None:
+            groups[key] = dict(zip(ROSTER_GROUP_COLUMNS, key), **{c: values[index].tolist() for c, values in columns.items()})
+        else:
+            # A professional whose rows span several chunks gets the partial lists concatenated.
+            for c, values in columns.items():
+                record[c].extend(values[index].tolist())
+
+
+def read_roster_records(path, chunksize=None):
+    """
+    Reads the roster CSV and aggregates the rows of every professional. Large files are
+    read in chunks aggregated one at a time, so the raw rows never sit in memory at once.
+
+    Args:
+        path (str): Path of the roster CSV.
+        chunksize (int): Number of rows read at once, defaults to Config.ROSTER_CHUNK_SIZE (0 reads the whole file).
+
+    Returns:
+        list: One record per professional with the training columns as lists.
+    """
+    chunksize = chunksize if chunksize is not None else Config.ROSTER_CHUNK_SIZE
+    groups = {}
+    chunks = pd.read_csv(path, chunksize=chunksize) if chunksize else [pd.read_csv(path)]
+    for chunk in chunks:
+        _aggregate(chunk, groups)
+    return list(groups.values())
+
+
+class Roster:
+    """
+    Professionals of the dataset indexed by lowercase email (USER_ID column), giving O(1)
+    lookups and batch iteration to the campaign instead of scanning the dataframe per email.
+    """
+
+    def __init__(self, records):
+        """
+        Args:
+            records (list): Aggregated roster records, one dict per professional.
+        """
+        self.professionals = {}
+        for record in records:
+            email = str(record['USER_ID']).strip().lower()
+            self.professionals[email] = dict(record, EMAIL=email)
+
+    @classmethod
+    def load(cls, path=None, chunksize=None, parquet_cache=None):
+        """
+        Loads the roster from its CSV, or from a Parquet cache of the aggregated roster
+        when the cache is more recent than the CSV.
+
+        Args:
+            path (str): Path of the roster CSV, defaults to Config.ROSTER_PATH.
+            chunksize (int): Number of CSV rows read at once, defaults to Config.ROSTER_CHUNK_SIZE.
+            parquet_cache (str): Path of the Parquet cache, defaults to Config.ROSTER_PARQUET_CACHE (disabled when empty).
+
+        Returns:
+            Roster: The loaded roster.
+        """
+        path = path or Config.ROSTER_PATH
+        parquet_cache = parquet_cache if parquet_cache is not None else Config.ROSTER_PARQUET_CACHE
+        records = None
+        if parquet_cache and os.path.exists(parquet_cache) and os.path.getmtime(parquet_cache) >= os.path.getmtime(path):
+            try:
+                df = pd.read_parquet(parquet_cache)
+                for column in ROSTER_LIST_COLUMNS:
+                    df[column] = df[column].map(list)
+                records = df.to_dict('records')
+            except (ImportError, ValueError, OSError) as e:
+                print(f"Roster cache {parquet_cache} ignored: {e}")
+        if records is None:
+            records = read_roster_records(path, chunksize)
+            if parquet_cache and records:
+                try:
+                    pd.DataFrame(records).to_parquet(parquet_cache, index=False)
+                except (ImportError, ValueError, OSError) as e:
+                    print(f"Roster cache {parquet_cache} not written: {e}")
+        return cls(records)
+
+    def __len__(self):
+        return len(self.professionals)
+
+    def __contains__(self, email):
+        return email.strip().lower() in self.professionals
+
+    def __iter__(self):
+        return iter(self.professionals.values())
+
+    def get(self, email):
+        """Returns the record of a professional, None if the email is not in the roster."""
+        return self.professionals.get(email.strip().lower())
+
+    def emails(self):
+        """Returns the emails of every professional in the roster."""
+        return list(self.professionals)
+
+    def select(self, emails=None):
+        """
+        Looks up the professionals to contact.
+
+        Args:
+            emails (list): Emails to select, every professional when empty.
+
+        Returns:
+            tuple: Records found, and emails missing from the roster.
+        """
+        if not emails:
+            return list(self), []
+        found, missing = [], []
+        for email in emails:
+            record = self.get(email)
+            if record is None:
+                missing.append(email)
+            else:
+                found.append(record)
+        return found, missing
+
+    def batches(self, size, emails=None):
+        """
+        Iterates over the selected professionals in batches.
+
+        Args:
+            size (int): Number of records per batch.
+            emails (list): Emails to select, every professional when empty.
+
+        Yields:
+            list: Records of the next batch.
+        """
+        records = self.select(emails)[0]
+        for start in range(0, len(records), size):
+            yield records[start:start + size]
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import Config
+
+
+class SlackEventRouter:
+    """
+    Routes incoming Slack message events to the conversation waiting on the channel.
+    Every open conversation registers an asyncio queue for its channel ID, events for
+    unknown channels, bot messages and message edits are dropped.
+    """
+
+    def __init__(self, max_seen_events=10000):
+        """
+        Args:
+            max_seen_events (int): Number of recent event IDs remembered to drop Slack retries.
+        """
+        self._inboxes = {}
+        self._lock = threading.Lock()
+        self._seen_events = OrderedDict()
+        self._max_seen_events = max_seen_events
+
+    def register(self, channel_id):
+        """
+        Creates the inbox of a channel. Must be called from the event loop running the conversation.
+
+        Args:
+            channel_id (str): Slack channel ID of the conversation.
+
+        Returns:
+            asyncio.Queue: Queue receiving the message events of the channel.
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._inboxes[channel_id] = (asyncio.get_running_loop(), queue)
+        return queue
+
+    def unregister(self, channel_id):
+        """Removes the inbox of a channel once its conversation is over."""
+        with self._lock:
+            self._inboxes.pop(channel_id, None)
+
+    def dispatch(self, event, event_id=None):
+        """
+        Delivers a Slack event to the inbox of its channel. Safe to call from any thread.
+
+        Args:
+            event (dict): The "event" object of a Slack event callback.
+            event_id (str): Event ID of the callback, used to ignore redelivered events.
+
+        Returns:
+            bool: True if the event was delivered to a conversation.
+        """
+        if event.get('type') != 'message' or event.get('bot_id') or event.get('subtype'):
+            return False
+        with self._lock:
+            if event_id is not None:
+                if event_id in self._seen_events:
+                    return False
+                self._seen_events[event_id] = True
+                if len(self._seen_events) > self._max_seen_events:
+                    self._seen_events.popitem(last=False)
+            target = self._inboxes.get(event.get('channel'))
+        if target is None:
+            return False
+        loop, queue = target
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+        return True
+
+
+def verify_slack_signature(signing_secret, timestamp, body, signature, max_age=300):
+    """
+    Checks the X-Slack-Signature header of a request.
+
+    Args:
+        signing_secret (str): Signing secret of the Slack app.
+        timestamp (str): Value of the X-Slack-Request-Timestamp header.
+        body (bytes): Raw request body.
+        signature (str): Value of the X-Slack-Signature header.
+        max_age (int): Maximum age in seconds of an accepted request.
+
+    Returns:
+        bool: True if the request was signed by Slack.
+    """
+    try:
+        if abs(time.time() - int(timestamp)) > max_age:
+            return False
+    except (TypeError, ValueError):
+        return False
+    basestring = b'v0:' + timestamp.encode() + b':' + body
+    expected = 'v0=' + hmac.new(signing_secret.encode(), basestring, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def sign_slack_request(signing_secret, body, timestamp=None):
+    """
+    Builds the headers Slack would send along with a request body, used by local stand-ins.
+
+    Args:
+        signing_secret (str): Signing secret of the Slack app.
+        body (bytes): Raw request body.
+        timestamp (str): Request timestamp, defaults to now.
+
+    Returns:
+        dict: X-Slack-Request-Timestamp and X-Slack-Signature headers.
+    """
+    timestamp = timestamp or str(int(time.time()))
+    basestring = b'v0:' + timestamp.encode() + b':' + body
+    signature = 'v0=' + hmac.new(signing_secret.encode(), basestring, hashlib.sha256).hexdigest()
+    return {'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': signature}
+
+
+class SlackEventListener:
+    """
+    Minimal Slack Events API endpoint. It answers the URL verification challenge,
+    checks request signatures (a signing secret is required unless unsigned local
+    requests are explicitly allowed) and hands every event callback to a SlackEventRouter,
+    acknowledging Slack immediately so replies are routed within milliseconds.
+    """
+
+    def __init__(self, router, signing_secret=None, host=None, port=None, path='/slack/events', allow_unsigned=None):
+        """
+        Args:
+            router (SlackEventRouter): Router receiving the events.
+            signing_secret (str): Signing secret of the Slack app, defaults to Config.SLACK_SIGNING_SECRET.
+            host (str): Interface to listen on, defaults to Config.SLACK_EVENTS_HOST.
+            port (int): Port to listen on, defaults to Config.SLACK_EVENTS_PORT (0 picks a free port).
+            path (str): URL path of the endpoint.
+            allow_unsigned (bool): Accept unsigned requests when no secret is configured, for local tests only:
+                the endpoint is then bound to 127.0.0.1. Defaults to Config.SLACK_EVENTS_ALLOW_UNSIGNED.
+
+        Raises:
+            ValueError: If no signing secret is configured and unsigned requests are not allowed.
+        """
+        self.router = router
+        self.signing_secret = signing_secret if signing_secret is not None else Config.SLACK_SIGNING_SECRET
+        self.host = host if host is not None else Config.SLACK_EVENTS_HOST
+        if not self.signing_secret:
+            if not (allow_unsigned if allow_unsigned is not None else Config.SLACK_EVENTS_ALLOW_UNSIGNED):
+                raise ValueError("SLACK_SIGNING_SECRET is required to receive Slack events "
+                                 "(SLACK_EVENTS_ALLOW_UNSIGNED=true accepts unsigned local requests).")
+            # Unverified requests are only accepted from this host.
+            self.host = '127.0.0.1'
+        self.port = port if port is not None else Config.SLACK_EVENTS_PORT
+        self.path = path
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """Local URL of the endpoint."""
+        return f"http://127.0.0.1:{self.port}{self.path}"
+
+    def start(self):
+        """Starts serving requests in a background thread."""
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != listener.path:
+                    self._respond(404, b'')
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if listener.signing_secret and not verify_slack_signature(
+                        listener.signing_secret,
+                        self.headers.get('X-Slack-Request-Timestamp'),
+                        body,
+                        self.headers.get('X-Slack-Signature')):
+                    self._respond(401, b'')
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self._respond(400, b'')
+                    return
+                if not isinstance(payload, dict):
+                    self._respond(400, b'')
+                    return
+                if payload.get('type') == 'url_verification':
+                    self._respond(200, payload.get('challenge', '').encode(), 'text/plain')
+                    return
+                self._respond(200, b'')
+                if payload.get('type') == 'event_callback':
+                    listener.router.dispatch(payload.get('event', {}), payload.get('event_id'))
+
+            def _respond(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Listening for Slack events on {self.host}:{self.port}{self.path}")
+        return self
+
+    def stop(self):
+        """Stops the endpoint."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -1,24 +1,39 @@
+import json
 import os
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 import urllib.error
 from slack.errors import SlackApiError
-import slack
+from slack_transport import SlackTransport, get_slack_transport
 
-# Initialize the Slack client using the token from configuration.
-client = slack.WebClient(token=Config.SLACK_TOKEN)
-def get_user_id(email):
+# Client replacing the shared Slack transport when set, e.g. by an offline stand-in.
+client = None
+
+
+def get_client():
+    """
+    Returns the Slack client of the module: the shared transport (pooled connections, rate
+    limits, priorities), built on first use so a worker process configures its rate share first.
+    """
+    return client or get_slack_transport()
+
+
+def get_user_id(email, slack_client=None):
     """
     Retrieves the Slack user ID for a given email address.
     
     Args:
         email (str): Email address to query for user ID.
+        slack_client (SlackTransport): Client used for the lookup, defaults to the module client.
     
     Returns:
         str or None: User ID if found, otherwise None.
     """
     try:
-        response = client.users_lookupByEmail(email=email)
+        response = (slack_client or get_client()).users_lookupByEmail(email=email)
         if response["ok"]:
             return response["user"]["id"]
         else:
@@ -29,30 +44,435 @@ def get_user_id(email):
         print(f"Unexpected error: {str(e)}")
     return None
 
-def get_latest_message(channel_id, retry_attempts=5, timeout=2):
+# Slack errors worth retrying: rate limits and server-side failures. Errors such as
+# channel_not_found or invalid_auth fail the same way on every attempt.
+RETRYABLE_SLACK_ERRORS = {'ratelimited', 'internal_error', 'fatal_error', 'service_unavailable', 'request_timeout'}
+
+
+def _retryable(error):
+    """Tells whether a Slack error code is worth retrying."""
+    return error in RETRYABLE_SLACK_ERRORS or str(error).startswith('http_5')
+
+
+def call_with_retry(method, retry_attempts=5, timeout=2, **kwargs):
     """
-    Retrieves the latest message from a specified Slack channel with retry mechanism.
-    
+    Calls a Slack API method, retrying rate-limited, server and network failures with
+    exponential backoff. Methods of a SlackTransport are called once, since the transport
+    already retries them while honouring the rate limits.
+
     Args:
-        channel_id (str): Channel ID from which to fetch the message.
-        retry_attempts (int): Number of times to retry the fetch in case of failure.
+        method (callable): Slack client method to call.
+        retry_attempts (int): Number of times to retry the call in case of failure.
         timeout (int): Initial timeout in seconds between retries, doubles on each retry.
-    
+        **kwargs: Arguments of the API method.
+
     Returns:
-        dict or None: Latest message if successful, otherwise None.
+        dict or None: API response if successful, otherwise None.
     """
+    if isinstance(getattr(method, '__self__', None), SlackTransport):
+        retry_attempts = 1
     attempt = 0
     while attempt < retry_attempts:
         try:
-            response = client.conversations_history(channel=channel_id, limit=1)
+            response = method(**kwargs)
             if response["ok"]:
-                return response['messages']
-        except (SlackApiError, urllib.error.URLError) as e:
-            print(f"Network error occurred: {e}. Retrying...")
-            time.sleep(timeout)
-            attempt += 1
-            timeout *= 2  # Exponential backoff
+                return response
+            error = response.get('error')
+        except SlackApiError as e:
+            error = (e.response or {}).get('error')
+        except urllib.error.URLError as e:
+            error = 'http_5xx'
+            print(f"Network error occurred: {e}.")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             break
+        attempt += 1
+        if not _retryable(error) or attempt >= retry_attempts:
+            print(f"Slack API call failed: {error}.")
+            break
+        print(f"Slack API call failed: {error}. Retrying...")
+        time.sleep(timeout)
+        timeout *= 2  # Exponential backoff
+    return None
+
+def get_latest_message(channel_id, retry_attempts=5, timeout=2):
+    """
+    Retrieves the latest message from a specified Slack channel with retry mechanism.
+    
+    Args:
+        channel_id (str): Channel ID from which to fetch the message.
+        retry_attempts (int): Number of times to retry the fetch in case of failure.
+        timeout (int): Initial timeout in seconds between retries, doubles on each retry.
+    
+    Returns:
+        dict or None: Latest message if successful, otherwise None.
+    """
+    response = call_with_retry(get_client().conversations_history, retry_attempts, timeout, channel=channel_id, limit=1)
+    if response is not None:
+        return response['messages']
     return None
+
+class ChannelCursor:
+    """
+    Remembers the newest message timestamp seen in a channel, so only newer messages
+    are fetched, and the timestamps already handled, so no message is processed twice.
+    """
+
+    def __init__(self, oldest=None, max_seen=1000):
+        """
+        Args:
+            oldest (str): Timestamp of the newest message already handled.
+            max_seen (int): Number of recent message timestamps remembered for deduplication.
+        """
+        self.oldest = oldest
+        self.max_seen = max_seen
+        self._seen = OrderedDict()
+
+    def advance(self, messages):
+        """
+        Moves the cursor past a batch of messages.
+
+        Args:
+            messages (list): Messages fetched or received for the channel, in any order.
+
+        Returns:
+            list: The messages not handled before, oldest first.
+        """
+        new_messages = []
+        for m in sorted(messages, key=lambda m: float(m['ts'])):
+            ts = m['ts']
+            if ts in self._seen or (self.oldest is not None and float(ts) <= float(self.oldest)):
+                continue
+            self._seen[ts] = True
+            new_messages.append(m)
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        if new_messages:
+            self.oldest = new_messages[-1]['ts']
+        return new_messages
+
+# Cursors of the channels whose conversations are in progress.
+channel_cursors = {}
+
+def get_channel_cursor(channel_id):
+    """Returns the cursor of a channel, creating it on first use."""
+    return channel_cursors.setdefault(channel_id, ChannelCursor())
+
+def forget_channel_cursor(channel_id):
+    """Drops the cursor of a channel once its conversation is over."""
+    channel_cursors.pop(channel_id, None)
+
+def is_human_message(message, user_id=None):
+    """
+    Tells whether a message was written by a person rather than a bot or a system event.
+
+    Args:
+        message (dict): Slack message.
+        user_id (str): When given, only messages from this user are accepted.
+    """
+    if message.get('bot_id') or message.get('subtype'):
+        return False
+    return user_id is None or message.get('user') == user_id
+
+def fetch_new_messages(channel_id, user_id=None, page_size=100, retry_attempts=5, timeout=2):
+    """
+    Fetches the messages posted in a channel since the last call, following pagination.
+    Only the delta after the channel cursor is requested, and messages are deduplicated by ts.
+
+    Args:
+        channel_id (str): Channel ID from which to fetch the messages.
+        user_id (str): When given, only messages from this user are returned.
+        page_size (int): Number of messages requested per page.
+        retry_attempts (int): Number of times to retry a page in case of failure.
+        timeout (int): Initial timeout in seconds between retries, doubles on each retry.
+
+    Returns:
+        list: New human messages, oldest first.
+    """
+    cursor = get_channel_cursor(channel_id)
+    messages = []
+    next_cursor = None
+    while True:
+        params = dict(channel=channel_id, limit=page_size)
+        if cursor.oldest is not None:
+            params['oldest'] = cursor.oldest
+        if next_cursor:
+            params['cursor'] = next_cursor
+        response = call_with_retry(get_client().conversations_history, retry_attempts, timeout, **params)
+        if response is None:
+            # Keep the cursor where it was so the missing pages are fetched on the next call.
+            return []
+        messages.extend(response['messages'])
+        next_cursor = (response.get('response_metadata') or {}).get('next_cursor')
+        if not response.get('has_more') or not next_cursor:
+            break
+    return [m for m in cursor.advance(messages) if is_human_message(m, user_id)]
+
+class AdaptiveBackoff:
+    """
+    Polling interval that grows while a channel stays idle and snaps back to the
+    minimum as soon as a new message arrives, so idle conversations are polled rarely.
+    """
+
+    def __init__(self, min_interval, max_interval, factor=1.5):
+        """
+        Args:
+            min_interval (float): Interval in seconds used right after activity.
+            max_interval (float): Upper bound of the interval in seconds.
+            factor (float): Growth factor applied after every idle poll.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.factor = factor
+        self.interval = min_interval
+
+    def next(self, activity):
+        """
+        Returns the number of seconds to wait before the next poll.
+
+        Args:
+            activity (bool): Whether the last poll returned new messages.
+        """
+        if activity:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        return self.interval
+
+# Threads sending the intermediate chat_update calls of streamed replies, so a generating
+# thread never waits for the workspace-wide chat.update rate limit.
+_update_executor = None
+_update_executor_lock = threading.Lock()
+
+
+def get_update_executor():
+    """Returns the thread pool sending the intermediate updates of streamed replies."""
+    global _update_executor
+    with _update_executor_lock:
+        if _update_executor is None:
+            _update_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='slack-update')
+        return _update_executor
+
+
+class SlackMessageStreamer:
+    """
+    Posts a reply as soon as its first words are generated, then keeps the message
+    up to date with chat_update at a throttled cadence while the rest streams in.
+    Intermediate updates are sent in the background, at most one at a time per message
+    and with the latest text, so generation never waits for the chat.update rate limit.
+    """
+
+    def __init__(self, slack_client, channel_id, update_interval=None, update_min_words=None):
+        """
+        Args:
+            slack_client (SlackTransport): Client used to post and update the message.
+            channel_id (str): Channel the reply is posted to.
+            update_interval (float): Minimum seconds between two updates, defaults to Config.SLACK_STREAM_UPDATE_INTERVAL.
+            update_min_words (int): Minimum number of new words of an update, defaults to Config.SLACK_STREAM_UPDATE_MIN_WORDS.
+        """
+        self.client = slack_client
+        self.channel_id = channel_id
+        self.update_interval = update_interval if update_interval is not None else Config.SLACK_STREAM_UPDATE_INTERVAL
+        self.update_min_words = update_min_words if update_min_words is not None else Config.SLACK_STREAM_UPDATE_MIN_WORDS
+        self.ts = None
+        self.text = ''
+        self._posted_text = ''
+        self._last_update = 0.0
+        self._pending_update = None
+
+    def update(self, text):
+        """
+        Receives the reply text generated so far.
+
+        Args:
+            text (str): Text generated so far, anything after <END_OF_TURN> is ignored.
+        """
+        self.text = text.split('<END_OF_TURN>')[0]
+        if not self.text.strip():
+            return
+        if self.ts is None:
+            self._send(self.text)
+        elif (self._pending_update is None or self._pending_update.done()) \
+                and time.monotonic() - self._last_update >= self.update_interval \
+                and len(self.text.split()) - len(self._posted_text.split()) >= self.update_min_words:
+            self._last_update = time.monotonic()
+            self._pending_update = get_update_executor().submit(self._send, self.text)
+
+    def finish(self, text=None):
+        """
+        Makes the posted message match the complete reply.
+
+        Args:
+            text (str): Complete reply, defaults to the last text received.
+
+        Returns:
+            str or None: Timestamp of the posted message, None if nothing was posted.
+        """
+        if text is not None:
+            self.text = text
+        if self._pending_update is not None:
+            self._pending_update.result()
+            self._pending_update = None
+        if self.text.strip() and self.text != self._posted_text:
+            self._send(self.text)
+        return self.ts
+
+    def restart(self):
+        """
+        Drops the reply streamed so far, when its generation is abandoned for another one:
+        the partial message is deleted and the next text is posted as a new message.
+        """
+        if self._pending_update is not None:
+            self._pending_update.result()
+            self._pending_update = None
+        if self.ts is not None:
+            try:
+                self.client.chat_delete(channel=self.channel_id, ts=self.ts)
+            except SlackApiError as e:
+                print(f"Slack API Error: {str(e)}")
+        self.ts = None
+        self.text = ''
+        self._posted_text = ''
+        self._last_update = 0.0
+
+    def _send(self, text):
+        """Posts the message the first time, updates it afterwards."""
+        try:
+            if self.ts is None:
+                response = self.client.chat_postMessage(channel=self.channel_id, text=text)
+                self.ts = response['ts']
+            else:
+                self.client.chat_update(channel=self.channel_id, ts=self.ts, text=text)
+            self._posted_text = text
+            self._last_update = time.monotonic()
+        except SlackApiError as e:
+            print(f"Slack API Error: {str(e)}")
+
+
+class SlackUserResolver:
+    """
+    Resolves professional emails to Slack user IDs from an index of the workspace directory.
+    The directory is bulk-loaded once with paginated users_list calls and persisted to disk,
+    so a campaign only falls back to users_lookupByEmail for the emails missing from it.
+    """
+
+    def __init__(self, slack_client=None, cache_path=None, ttl=None, page_size=None):
+        """
+        Args:
+            slack_client (SlackTransport): Client used for the directory and single lookups, defaults to the module client.
+            cache_path (str): JSON file persisting the email to user ID index, defaults to Config.SLACK_USER_CACHE_PATH (disabled when empty).
+            ttl (float): Seconds after which the persisted index is reloaded from Slack, defaults to Config.SLACK_USER_CACHE_TTL.
+            page_size (int): Number of members requested per users_list page, defaults to Config.SLACK_USERS_PAGE_SIZE.
+        """
+        self.client = slack_client or get_client()
+        self.cache_path = cache_path if cache_path is not None else Config.SLACK_USER_CACHE_PATH
+        self.ttl = ttl if ttl is not None else Config.SLACK_USER_CACHE_TTL
+        self.page_size = page_size or Config.SLACK_USERS_PAGE_SIZE
+        self.user_ids = {}
+        self.not_found = set()
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        """Loads the persisted index, returns False when it is missing or expired."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Slack user cache {self.cache_path} ignored: {e}")
+            return False
+        if time.time() - data.get('loaded_at', 0) > self.ttl:
+            return False
+        self.user_ids = data.get('users', {})
+        self.loaded_at = data['loaded_at']
+        return True
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        # Unique per process, worker processes may save the directory at the same time.
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'loaded_at': self.loaded_at, 'users': self.user_ids}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def load_directory(self):
+        """
+        Indexes the email of every active member of the workspace.
+
+        Returns:
+            int: Number of API pages fetched, None if the directory could not be loaded.
+        """
+        user_ids = {}
+        cursor = None
+        pages = 0
+        while True:
+            response = call_with_retry(self.client.users_list, limit=self.page_size, cursor=cursor)
+            if response is None:
+                return None
+            pages += 1
+            for member in response.get('members', []):
+                email = member.get('profile', {}).get('email')
+                if email and not member.get('deleted') and not member.get('is_bot'):
+                    user_ids[email.lower()] = member['id']
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+        self.user_ids = user_ids
+        self.loaded_at = time.time()
+        self._save_cache()
+        return pages
+
+    def ensure_loaded(self):
+        """Loads the index from the disk cache, or from Slack when the cache is missing or expired."""
+        with self._lock:
+            if self.loaded_at is not None and time.time() - self.loaded_at <= self.ttl:
+                return
+            if not self._load_cache():
+                self.load_directory()
+
+    def resolve(self, email):
+        """
+        Returns the Slack user ID of an email, None if the user is not in the workspace.
+        """
+        return self.resolve_many([email]).get(email.strip().lower())
+
+    def resolve_many(self, emails):
+        """
+        Resolves a batch of emails, looking up individually only those missing from the index.
+
+        Args:
+            emails (list): Emails to resolve.
+
+        Returns:
+            dict: User ID (None when not found) keyed by lowercase email.
+        """
+        start = time.time()
+        self.ensure_loaded()
+        emails = [e.strip().lower() for e in emails]
+        resolved = {}
+        lookups = 0
+        for email in emails:
+            user_id = self.user_ids.get(email)
+            if user_id is None and email not in self.not_found:
+                lookups += 1
+                user_id = get_user_id(email, self.client)
+                with self._lock:
+                    if user_id is None:
+                        self.not_found.add(email)
+                    else:
+                        self.user_ids[email] = user_id
+            resolved[email] = user_id
+        if lookups:
+            with self._lock:
+                if self.loaded_at is not None:
+                    self._save_cache()
+        if len(emails) > 1:
+            elapsed = time.time() - start
+            found = sum(1 for user_id in resolved.values() if user_id is not None)
+            print(f"Resolved {found}/{len(emails)} Slack users in {elapsed:.2f}s "
+                  f"({len(emails) / max(elapsed, 1e-6):.0f} emails/s, {lookups} single lookups)")
+        return resolved
@@ -0,0 +1,280 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from slack.errors import SlackApiError
+from config import Config
+from instrumentation import span
+
+# Priorities of the queued requests, lower values are sent first.
+PRIORITY_REPLY = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+# Requests per minute and burst size of Slack's rate limit tiers.
+SLACK_RATE_TIERS = {
+    1: (1, 1),
+    2: (20, 3),
+    3: (50, 5),
+    4: (100, 10),
+}
+
+# Tier and priority of the API methods used by the application; chat.postMessage is limited
+# to about one message per second and per channel, so it gets a bucket per channel.
+SLACK_METHOD_LIMITS = {
+    'chat.postMessage': (None, PRIORITY_REPLY),
+    'chat.update': (3, PRIORITY_REPLY),
+    'chat.delete': (3, PRIORITY_REPLY),
+    'conversations.open': (3, PRIORITY_DEFAULT),
+    'conversations.history': (3, PRIORITY_BACKGROUND),
+    'users.lookupByEmail': (3, PRIORITY_BACKGROUND),
+    'users.list': (2, PRIORITY_BACKGROUND),
+}
+CHAT_POST_MESSAGE_RATE = (60, 3)
+
+
+class _PriorityWaiters:
+    """Queue of threads waiting for a shared resource, served in priority then arrival order."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+
+    def wait_turn(self, priority, ready):
+        """
+        Blocks until the caller is the first waiter and ready() returns None.
+
+        Args:
+            priority (int): Priority of the caller.
+            ready (callable): Called with the condition held, returns None when the resource
+                can be taken, otherwise the seconds to wait before checking again (0 waits for a notification).
+        """
+        with self.condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._heap, entry)
+            try:
+                while True:
+                    delay = ready() if self._heap[0] == entry else 0
+                    if delay is None:
+                        return
+                    self.condition.wait(delay or None)
+            finally:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                self.condition.notify_all()
+
+
+class TokenBucket:
+    """
+    Token bucket enforcing a Slack rate limit, serving waiting callers by priority. A bucket
+    can be paused for the Retry-After delay of a rate-limited response.
+    """
+
+    def __init__(self, per_minute, burst):
+        """
+        Args:
+            per_minute (float): Sustained number of requests per minute.
+            burst (int): Number of requests that can be sent at once.
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters = _PriorityWaiters()
+
+    def _ready(self):
+        now = time.monotonic()
+        if now < self.paused_until:
+            self.updated_at = now
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, priority=PRIORITY_DEFAULT):
+        """Blocks until a request can be sent."""
+        self._waiters.wait_turn(priority, self._ready)
+
+    def pause(self, seconds):
+        """Stops granting requests for the given number of seconds, then resumes with a single request."""
+        with self._waiters.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 1.0)
+
+
+class PrioritySemaphore:
+    """Semaphore limiting the requests in flight, granting free slots by priority."""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._waiters = _PriorityWaiters()
+
+    def _ready(self):
+        if self.slots > 0:
+            self.slots -= 1
+            return None
+        return 0
+
+    def acquire(self, priority=PRIORITY_DEFAULT):
+        self._waiters.wait_turn(priority, self._ready)
+
+    def release(self):
+        with self._waiters.condition:
+            self.slots += 1
+            self._waiters.condition.notify_all()
+
+
+class SlackTransport:
+    """
+    Shared Slack Web API client: one pooled HTTP session for every call, per-method token
+    buckets following Slack's rate tiers, Retry-After handling on 429 responses and a
+    priority queue in front of the connections so replies to professionals go out before
+    polling and directory calls. It exposes the WebClient methods used by the application
+    (chat_postMessage, conversations_history, ...) and raises SlackApiError like WebClient.
+    """
+
+    def __init__(self, token, base_url='https://slack.com/api/', max_connections=None, max_retries=None, timeout=30, rate_share=None):
+        """
+        Args:
+            token (str): Bot token of the Slack app.
+            base_url (str): Base URL of the Slack Web API.
+            max_connections (int): Size of the connection pool and maximum requests in flight, defaults to Config.SLACK_MAX_CONNECTIONS.
+            max_retries (int): Attempts of a rate-limited or failed request, defaults to Config.SLACK_MAX_RETRIES.
+            timeout (float): Seconds before an HTTP request times out.
+            rate_share (float): Share of the workspace-wide tier limits granted to this transport, defaults to Config.SLACK_RATE_SHARE.
+        """
+        self.token = token
+        self.base_url = base_url
+        self.max_connections = max_connections or Config.SLACK_MAX_CONNECTIONS
+        self.max_retries = max_retries or Config.SLACK_MAX_RETRIES
+        self.timeout = timeout
+        self.rate_share = rate_share or Config.SLACK_RATE_SHARE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.in_flight = PrioritySemaphore(self.max_connections)
+        self.buckets = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _bucket(self, method, params):
+        """Returns the token bucket limiting a call."""
+        tier = SLACK_METHOD_LIMITS.get(method, (3, PRIORITY_DEFAULT))[0]
+        key = (method, params.get('channel')) if tier is None else method
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if tier is None:
+                    # The channels of a process are its own, their limit is not shared.
+                    bucket = TokenBucket(*CHAT_POST_MESSAGE_RATE)
+                else:
+                    per_minute, burst = SLACK_RATE_TIERS[tier]
+                    bucket = TokenBucket(per_minute * self.rate_share, max(1, int(burst * self.rate_share)))
+                self.buckets[key] = bucket
+            return bucket
+
+    def api_call(self, method, priority=None, **params):
+        """
+        Calls a Slack Web API method once its rate limit and a connection allow it.
+
+        Args:
+            method (str): API method, e.g. "chat.postMessage".
+            priority (int): Queue priority, defaults to the priority of the method.
+            **params: Arguments of the method, None values are omitted.
+
+        Returns:
+            dict: API response.
+
+        Raises:
+            SlackApiError: If the response is not ok or the request keeps failing.
+        """
+        if priority is None:
+            priority = SLACK_METHOD_LIMITS.get(method, (None, PRIORITY_DEFAULT))[1]
+        data = {k: ','.join(v) if isinstance(v, (list, tuple)) else v for k, v in params.items() if v is not None}
+        bucket = self._bucket(method, params)
+        with span('slack', method) as call_span:
+            return self._send(method, data, bucket, priority, call_span)
+
+    def _send(self, method, data, bucket, priority, call_span):
+        """Sends a request until it succeeds, recording its queue wait and retries on the span if any."""
+        delay = 1.0
+        queue_wait = 0.0
+        for attempt in range(self.max_retries):
+            waiting = time.perf_counter()
+            bucket.acquire(priority)
+            self.in_flight.acquire(priority)
+            queue_wait += time.perf_counter() - waiting
+            if call_span is not None:
+                call_span.set(retries=attempt, queue_wait=queue_wait)
+            try:
+                self.stats['requests'] += 1
+                response = self.session.post(self.base_url + method, data=data, timeout=self.timeout,
+                                             headers={'Authorization': f'Bearer {self.token}'})
+            except requests.RequestException as e:
+                self.stats['errors'] += 1
+                error = {'ok': False, 'error': str(e)}
+                time.sleep(delay)
+                delay *= 2
+                continue
+            finally:
+                self.in_flight.release()
+            if response.status_code == 429:
+                # Every caller of the method waits for the delay announced by Slack.
+                self.stats['rate_limited'] += 1
+                bucket.pause(float(response.headers.get('Retry-After', 1)))
+                error = {'ok': False, 'error': 'ratelimited'}
+                continue
+            if response.status_code >= 500:
+                self.stats['errors'] += 1
+                error = {'ok': False, 'error': f'http_{response.status_code}'}
+                time.sleep(delay)
+                delay *= 2
+                continue
+            body = response.json()
+            if not body.get('ok'):
+                raise SlackApiError(f"The request to the Slack API failed. (url: {self.base_url + method})", body)
+            return body
+        raise SlackApiError(f"The request to the Slack API failed after {self.max_retries} attempts. (url: {self.base_url + method})", error)
+
+    def chat_postMessage(self, channel, text, **kwargs):
+        return self.api_call('chat.postMessage', channel=channel, text=text, **kwargs)
+
+    def chat_update(self, channel, ts, text, **kwargs):
+        return self.api_call('chat.update', channel=channel, ts=ts, text=text, **kwargs)
+
+    def chat_delete(self, channel, ts, **kwargs):
+        return self.api_call('chat.delete', channel=channel, ts=ts, **kwargs)
+
+    def conversations_open(self, users, **kwargs):
+        return self.api_call('conversations.open', users=users, **kwargs)
+
+    def conversations_history(self, channel, **kwargs):
+        return self.api_call('conversations.history', channel=channel, **kwargs)
+
+    def users_lookupByEmail(self, email, **kwargs):
+        return self.api_call('users.lookupByEmail', email=email, **kwargs)
+
+    def users_list(self, **kwargs):
+        return self.api_call('users.list', **kwargs)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_slack_transport():
+    """Returns the Slack transport shared by the whole process."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = SlackTransport(Config.SLACK_TOKEN)
+        return _transport
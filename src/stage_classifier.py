@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from config import Config
+
+STAGE_IDS = [str(i) for i in range(1, 9)]
+END_STAGE = '8'
+
+# Confidence reported for a keyword rule: the rules are precise, not certain.
+RULE_CONFIDENCE = 0.95
+
+# Exact phrases of the professional ending the conversation: refusals, whole-message goodbyes and
+# demo requests, whose link is sent by the post-conversation analysis. Anything looser is left
+# to the LLM analyzer.
+REFUSAL_PATTERN = re.compile(
+    r"\b(i'?m|i am|we'?re|we are) (not|no longer) interested\s*([.,!;]|$)|^\W*(sorry,? )?not interested\s*([.,!;]|$)"
+    r"|^\W*no,? thanks?( you)?\W*$|\bunsubscribe me\b|\bremove me from\b"
+    r"|\bstop (messaging|texting|contacting|writing to) me\b|\b(don'?t|do not) (contact|message|text) me\b")
+_GOODBYE = r"(good ?bye|bye|have a (good|great|nice) (day|one|week))"
+GOODBYE_PATTERN = re.compile(rf"^\W*((ok|okay|thanks?|thank you)\W+)*{_GOODBYE}(\W+{_GOODBYE})*\W*$")
+DEMO_REQUEST_PATTERN = re.compile(
+    r"\b(i'?d|i would|we'?d|we would) (like|love) to (book|schedule|set up|arrange) (a |the )?demo\b"
+    r"|^\W*(can|could) (we|i) (book|schedule|set up|arrange) (a |the )?demo\b")
+# Negations ruling a demo request out, e.g. "I wouldn't like to book a demo".
+NEGATION_PATTERN = re.compile(r"\b(not|never|no)\b|n'?t\b")
+# Agent message ending with a demo offer, and a reply that is nothing but an acceptance.
+DEMO_OFFER_PATTERN = re.compile(
+    r"\b(would|do|are) you (like|want|be interested in|interested in|up for) (to (book|schedule|see|have) )?"
+    r"(a|the) (quick |short )?demo\b[^?.!]*\?\W*$")
+ACCEPTANCE_PATTERN = re.compile(
+    r"^\W*(yes|yeah|yep|sure|ok|okay|absolutely|definitely|of course)"
+    r"(\W+(please|sure|sounds good|that would be great|let'?s do it|i would|i'?d love to))*\W*$")
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def split_turns(history, person_name):
+    """
+    Returns the latest message of the professional and the agent message it answers, without
+    the end-of-turn markers and the agent's name, from a conversation history. The agent and
+    the professional take turns, the agent first, as in build_transcript: the agent's replies
+    are stored without the name prefix, so the speaker is known from the position only.
+    """
+    # Index of the latest turn of the professional, the odd indexes being theirs.
+    latest = len(history) - 1 - len(history) % 2
+    if latest < 1:
+        return '', ''
+    human = history[latest].replace('<END_OF_TURN>', '').strip()
+    agent = history[latest - 1].replace('<END_OF_TURN>', '').strip()
+    if agent.startswith(f"{person_name}:"):
+        agent = agent[len(person_name) + 1:].strip()
+    return human, agent
+
+
+class KeywordStageRules:
+    """Keyword rules deciding the stage of the obvious turns from exact phrases."""
+
+    def predict(self, human, agent, stage, turns):
+        """
+        Returns:
+            tuple: (stage ID, confidence), the stage is None when no rule applies.
+        """
+        if turns == 0:
+            # Nothing has been said yet, the conversation starts with the introduction.
+            return '1', 1.0
+        text = human.lower().strip()
+        if not text:
+            return None, 0.0
+        if REFUSAL_PATTERN.search(text) or GOODBYE_PATTERN.match(text):
+            return END_STAGE, RULE_CONFIDENCE
+        if NEGATION_PATTERN.search(text):
+            return None, 0.0
+        if DEMO_REQUEST_PATTERN.search(text):
+            return END_STAGE, RULE_CONFIDENCE
+        if DEMO_OFFER_PATTERN.search(agent.lower()) and ACCEPTANCE_PATTERN.match(text):
+            return END_STAGE, RULE_CONFIDENCE
+        return None, 0.0
+
+
+class LogisticStageModel:
+    """
+    Multinomial logistic regression over hashed features of a turn: words and word pairs of the
+    professional's message, words of the agent message it answers, the current stage and the
+    number of turns. Trained with numpy on stage decisions logged from the LLM analyzer.
+    """
+
+    def __init__(self, dimension=4096, weights=None, bias=None):
+        """
+        Args:
+            dimension (int): Number of hashed features.
+            weights (ndarray): Weights of shape (dimension, 8), zeros when None.
+            bias (ndarray): Bias of shape (8,), zeros when None.
+        """
+        self.dimension = dimension
+        self.weights = weights if weights is not None else np.zeros((dimension, len(STAGE_IDS)), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(STAGE_IDS), dtype=np.float32)
+
+    def features(self, human, agent, stage, turns):
+        """Returns the indices of the hashed features of a turn."""
+        words = _WORD_PATTERN.findall(human.lower())
+        names = [f"h:{w}" for w in words] + [f"h2:{a} {b}" for a, b in zip(words, words[1:])]
+        names += [f"a:{w}" for w in set(_WORD_PATTERN.findall(agent.lower()))]
+        names += [f"stage:{stage}", f"turns:{min(turns, 10)}", "bias"]
+        return np.unique(np.fromiter((zlib.crc32(name.encode()) % self.dimension for name in names), dtype=np.int64))
+
+    def probabilities(self, indices):
+        """Returns the probability of every stage for the features of a turn."""
+        scores = self.weights[indices].sum(axis=0) + self.bias
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
+    def predict(self, human, agent, stage, turns):
+        """
+        Returns:
+            tuple: (stage ID, confidence) of the most probable stage.
+        """
+        probabilities = self.probabilities(self.features(human, agent, stage, turns))
+        best = int(probabilities.argmax())
+        return STAGE_IDS[best], float(probabilities[best])
+
+    def fit(self, examples, epochs=200, learning_rate=0.5, l2=1e-4):
+        """
+        Trains the model with full-batch gradient descent.
+
+        Args:
+            examples (list): Logged decisions, dicts with human, agent, stage, turns and label (stage ID).
+            epochs (int): Passes over the examples.
+            learning_rate (float): Step size.
+            l2 (float): Weight of the L2 penalty.
+
+        Returns:
+            LogisticStageModel: The trained model.
+        """
+        examples = [e for e in examples if e['label'] in STAGE_IDS]
+        if not examples:
+            return self
+        x = np.zeros((len(examples), self.dimension), dtype=np.float32)
+        for row, example in enumerate(examples):
+            x[row, self.features(example['human'], example['agent'], example['stage'], example['turns'])] = 1.0
+        y = np.zeros((len(examples), len(STAGE_IDS)), dtype=np.float32)
+        y[np.arange(len(examples)), [STAGE_IDS.index(e['label']) for e in examples]] = 1.0
+        for _ in range(epochs):
+            scores = x @ self.weights + self.bias
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            error = (scores / scores.sum(axis=1, keepdims=True) - y) / len(examples)
+            self.weights -= learning_rate * (x.T @ error + l2 * self.weights)
+            self.bias -= learning_rate * error.sum(axis=0)
+        return self
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['weights'].shape[0], data['weights'], data['bias'])
+
+
+class StageClassifier:
+    """
+    Local fast path in front of the StageAnalyzerChain: keyword rules, then an optional logistic
+    regression model, decide the stage of a turn in microseconds when they are confident enough,
+    and the LLM analyzer is only called for the other turns. The decisions of the LLM can be
+    logged as training data for the model.
+    """
+
+    def __init__(self, model=None, threshold=None, log_path=None, rules=None):
+        """
+        Args:
+            model (LogisticStageModel): Model used when no rule applies, rules only when None.
+            threshold (float): Minimum confidence of a local decision, defaults to Config.STAGE_CLASSIFIER_THRESHOLD.
+            log_path (str): JSON-lines file receiving the LLM decisions, defaults to Config.STAGE_CLASSIFIER_LOG_PATH (disabled when empty).
+            rules (KeywordStageRules): Rules checked first, defaults to KeywordStageRules().
+        """
+        self.model = model
+        self.threshold = threshold if threshold is not None else Config.STAGE_CLASSIFIER_THRESHOLD
+        self.log_path = log_path if log_path is not None else Config.STAGE_CLASSIFIER_LOG_PATH
+        self.rules = rules or KeywordStageRules()
+        self._lock = threading.Lock()
+
+    def classify(self, history, stage, person_name):
+        """
+        Decides the stage reached after the latest message of the professional.
+
+        Args:
+            history (list): Conversation history.
+            stage (str): ID of the current stage.
+            person_name (str): Name of the agent, prefixing its messages in the history.
+
+        Returns:
+            str or None: Stage ID, None when the LLM analyzer must decide.
+        """
+        turn = split_turns(history, person_name) + (stage, len(history))
+        stage_id, confidence = self.rules.predict(*turn)
+        if stage_id is None and self.model is not None:
+            stage_id, confidence = self.model.predict(*turn)
+        if stage_id is None or confidence < self.threshold:
+            return None
+        return stage_id
+
+    def record(self, history, stage, person_name, label):
+        """Logs a stage decided by the LLM analyzer, as a training example for the model."""
+        if not self.log_path or label not in STAGE_IDS:
+            return
+        human, agent = split_turns(history, person_name)
+        line = json.dumps(dict(human=human, agent=agent, stage=stage, turns=len(history), label=label))
+        with self._lock:
+            with open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+
+
+def load_examples(path):
+    """Reads the stage decisions logged by StageClassifier.record."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def train_stage_model(log_path=None, model_path=None):
+    """
+    Trains the logistic stage model on the logged LLM decisions and saves it.
+
+    Args:
+        log_path (str): Logged decisions, defaults to Config.STAGE_CLASSIFIER_LOG_PATH.
+        model_path (str): File of the model, defaults to Config.STAGE_CLASSIFIER_MODEL_PATH.
+
+    Returns:
+        int: Number of examples the model was trained on.
+    """
+    examples = load_examples(log_path or Config.STAGE_CLASSIFIER_LOG_PATH)
+    LogisticStageModel().fit(examples).save(model_path or Config.STAGE_CLASSIFIER_MODEL_PATH)
+    return len(examples)
+
+
+_stage_classifier = None
+_stage_classifier_lock = threading.Lock()
+
+
+def get_stage_classifier():
+    """
+    Returns the stage classifier shared by the process, with the trained model if its file
+    exists, or None when Config.STAGE_CLASSIFIER_ENABLED is off.
+    """
+    global _stage_classifier
+    if not Config.STAGE_CLASSIFIER_ENABLED:
+        return None
+    with _stage_classifier_lock:
+        if _stage_classifier is None:
+            path = Config.STAGE_CLASSIFIER_MODEL_PATH
+            model = LogisticStageModel.load(path) if path and os.path.exists(path) else None
+            _stage_classifier = StageClassifier(model)
+        return _stage_classifier
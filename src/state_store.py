@@ -0,0 +1,185 @@
+from abc import ABC, abstractmethod
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from config import Config
+
+
+class StateStore(ABC):
+    """
+    Durable state of the conversations of a campaign. Every conversation has a snapshot of
+    its agent and runner state and an append-only log of its turns. A worker claims a
+    conversation by channel ID before driving it, so several worker processes can share
+    one store and a conversation left by a stopped worker is resumed by the next one.
+    """
+
+    @abstractmethod
+    def heartbeat(self, worker_id):
+        """Records that a worker is alive, its claims stay valid for Config.STATE_LEASE_SECONDS."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, channel_id, worker_id, email=None):
+        """
+        Claims the open conversation of a channel, creating it if there is none.
+
+        Args:
+            channel_id (str): Slack channel of the conversation.
+            worker_id (str): ID of the claiming worker.
+            email (str): Email of the professional.
+
+        Returns:
+            dict: conversation_id and state (the last snapshot, None for a new conversation),
+            or None when another live worker owns the conversation.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, conversation_id, state, history):
+        """
+        Saves the snapshot of a conversation and appends the turns not logged yet.
+
+        Args:
+            conversation_id (int): ID returned by claim.
+            state (dict): JSON-serializable snapshot.
+            history (list): Full conversation history, only the entries past the logged ones are written.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def turns(self, conversation_id):
+        """Returns the logged turns of a conversation, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, conversation_id, status):
+        """Closes a conversation with its final status and drops its claim."""
+        raise NotImplementedError
+
+
+class SQLiteStateStore(StateStore):
+    """StateStore kept in a SQLite file shared by the worker processes of a host."""
+
+    def __init__(self, path=None, lease_seconds=None):
+        """
+        Args:
+            path (str): Path of the SQLite file, defaults to Config.STATE_STORE_PATH.
+            lease_seconds (float): Seconds without heartbeat after which a worker's claims expire,
+                defaults to Config.STATE_LEASE_SECONDS.
+        """
+        self.path = path or Config.STATE_STORE_PATH
+        self.lease_seconds = lease_seconds if lease_seconds is not None else Config.STATE_LEASE_SECONDS
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Transactions are explicit, claims take the write lock up front with BEGIN IMMEDIATE.
+        self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id TEXT NOT NULL,
+                email TEXT,
+                status TEXT NOT NULL,
+                owner TEXT,
+                state TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS conversations_channel ON conversations (channel_id, status);
+            CREATE TABLE IF NOT EXISTS turns (
+                conversation_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            );
+        """)
+
+    def heartbeat(self, worker_id):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)", (worker_id, time.time()))
+
+    def claim(self, channel_id, worker_id, email=None):
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT c.conversation_id, c.owner, c.state, w.heartbeat_at FROM conversations c "
+                    "LEFT JOIN workers w ON w.worker_id = c.owner WHERE c.channel_id = ? AND c.status = 'open'",
+                    (channel_id,)
+                ).fetchone()
+                self._connection.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)", (worker_id, now))
+                if row is None:
+                    cursor = self._connection.execute(
+                        "INSERT INTO conversations (channel_id, email, status, owner, updated_at) VALUES (?, ?, 'open', ?, ?)",
+                        (channel_id, email, worker_id, now)
+                    )
+                    claimed = {'conversation_id': cursor.lastrowid, 'state': None}
+                elif row[1] not in (None, worker_id) and row[3] is not None and now - row[3] < self.lease_seconds:
+                    claimed = None
+                else:
+                    self._connection.execute("UPDATE conversations SET owner = ?, updated_at = ? WHERE conversation_id = ?",
+                                             (worker_id, now, row[0]))
+                    claimed = {'conversation_id': row[0], 'state': json.loads(row[2]) if row[2] else None}
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def save(self, conversation_id, state, history):
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                logged = self._connection.execute("SELECT COUNT(*) FROM turns WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO turns (conversation_id, seq, text, created_at) VALUES (?, ?, ?, ?)",
+                    [(conversation_id, seq, text, now) for seq, text in enumerate(history[logged:], start=logged)]
+                )
+                self._connection.execute("UPDATE conversations SET state = ?, updated_at = ? WHERE conversation_id = ?",
+                                         (json.dumps(state), now, conversation_id))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def turns(self, conversation_id):
+        with self._lock:
+            rows = self._connection.execute("SELECT text FROM turns WHERE conversation_id = ? ORDER BY seq", (conversation_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def release(self, conversation_id, status):
+        with self._lock:
+            self._connection.execute("UPDATE conversations SET status = ?, owner = NULL, updated_at = ? WHERE conversation_id = ?",
+                                     (status, time.time(), conversation_id))
+
+
+def default_worker_id():
+    """Returns Config.WORKER_ID, or an ID unique to the process when it is not set."""
+    return Config.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """
+    Returns the process-wide state store configured by Config.STATE_STORE_BACKEND
+    ("sqlite" or "none"), None when conversation state is not persisted.
+    """
+    global _state_store
+    if Config.STATE_STORE_BACKEND == 'none':
+        return None
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = SQLiteStateStore()
+        return _state_store
@@ -0,0 +1,266 @@
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+from collections import Counter, OrderedDict
+from config import Config
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to nodes. Every node owns `replicas` points of the
+    ring, so keys are spread evenly and adding or removing a node only moves the keys of
+    that node.
+    """
+
+    def __init__(self, nodes=(), replicas=256):
+        """
+        Args:
+            nodes (iterable): Names of the nodes.
+            replicas (int): Number of points of every node on the ring.
+        """
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        """Adds a node to the ring."""
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            bisect.insort(self._points, point)
+            self._nodes[point] = node
+
+    def remove(self, node):
+        """Removes a node, its keys move to the following nodes of the ring."""
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            self._points.remove(point)
+            del self._nodes[point]
+
+    def node_for(self, key):
+        """Returns the node owning a key."""
+        if not self._points:
+            raise ValueError("The hash ring has no nodes.")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._nodes[self._points[index]]
+
+
+def shard_key(professional, user_id=None):
+    """
+    Key assigning a professional to a worker: the Slack user ID, which identifies the DM
+    channel of the conversation and is the sender of every message event the professional
+    triggers, or the email when the professional has no Slack account.
+    """
+    return user_id or professional['EMAIL'].lower()
+
+
+def worker_path(path, name):
+    """Returns the file of a worker derived from a file of the process, e.g. links.json -> links.worker-0.json."""
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{name}{extension}"
+
+
+def configure_worker(name, workers):
+    """
+    Adjusts the configuration of a worker process before its clients are built: the limits
+    that hold across processes are split between the workers, and the files rewritten as a
+    whole by their process get one copy per worker. The state store and the embedding file
+    store are safe to share between processes.
+
+    Args:
+        name (str): Name of the worker.
+        workers (int): Number of worker processes of the campaign.
+    """
+    # Slack's tier limits hold for the whole workspace and the TPM quota for the whole deployment.
+    Config.SLACK_RATE_SHARE = 1.0 / workers
+    if Config.LLM_TOKENS_PER_MINUTE:
+        Config.LLM_TOKENS_PER_MINUTE = max(Config.LLM_TOKENS_PER_MINUTE // workers, 1)
+    Config.CALENDLY_POOL_WATERMARK = max(-(-Config.CALENDLY_POOL_WATERMARK // workers), 1)
+    Config.CALENDLY_POOL_PATH = worker_path(Config.CALENDLY_POOL_PATH, name)
+    Config.METRICS_PROMETHEUS_PATH = worker_path(Config.METRICS_PROMETHEUS_PATH, name)
+    Config.METRICS_JSONL_PATH = worker_path(Config.METRICS_JSONL_PATH, name)
+    if Config.MEMORY_STORE_PATH:
+        # Professionals keep their worker across runs, and so their memories.
+        Config.MEMORY_STORE_PATH = os.path.join(Config.MEMORY_STORE_PATH, name)
+
+
+def run_worker(name, professionals, events, results, workers=1):
+    """
+    Entry point of a worker process: runs the campaign for its share of the professionals.
+
+    Args:
+        name (str): Name of the worker, also its ID in the state store.
+        professionals (list): Roster records assigned to the worker.
+        events (multiprocessing.Queue): Slack message events routed to the worker, None when polling.
+        results (multiprocessing.Queue): Receives the (email, status) pairs of the worker's conversations.
+        workers (int): Number of worker processes of the campaign.
+    """
+    import warnings
+    warnings.filterwarnings('ignore')
+    # The spawned process has already imported the modules of the main script (as __mp_main__),
+    # so the worker settings must only be read by what is built from here on, e.g. the Slack
+    # transport, which is created on first use.
+    configure_worker(name, workers)
+    from campaign import Campaign
+    from llm_registry import get_llm
+    from slack_events import SlackEventRouter
+    from slack_transport import get_slack_transport
+
+    router = None
+    if events is not None:
+        router = SlackEventRouter()
+
+        def forward():
+            while True:
+                item = events.get()
+                if item is None:
+                    return
+                router.dispatch(*item)
+
+        threading.Thread(target=forward, daemon=True).start()
+    campaign = Campaign(get_slack_transport(), get_llm('llm'), get_llm('llm_lucas'), router=router, worker_id=name)
+    states = asyncio.run(campaign.run(professionals))
+    results.put([(state.email, state.status) for state in states])
+
+
+class ShardedEventRouter:
+    """
+    SlackEventRouter stand-in for the supervisor: drops Slack retries and events that are
+    not human messages, and forwards the others to the queue of the worker owning the sender.
+    """
+
+    def __init__(self, ring, queues, max_seen_events=10000):
+        """
+        Args:
+            ring (HashRing): Ring assigning Slack user IDs to workers.
+            queues (dict): Event queue of every worker, by name.
+            max_seen_events (int): Number of recent event IDs remembered to drop Slack retries.
+        """
+        self.ring = ring
+        self.queues = queues
+        self._lock = threading.Lock()
+        self._seen_events = OrderedDict()
+        self._max_seen_events = max_seen_events
+
+    def dispatch(self, event, event_id=None):
+        """
+        Forwards a Slack event to the worker owning its sender. Safe to call from any thread.
+
+        Returns:
+            bool: True if the event was forwarded.
+        """
+        if event.get('type') != 'message' or event.get('bot_id') or event.get('subtype') or not event.get('user'):
+            return False
+        with self._lock:
+            if event_id is not None:
+                if event_id in self._seen_events:
+                    return False
+                self._seen_events[event_id] = True
+                if len(self._seen_events) > self._max_seen_events:
+                    self._seen_events.popitem(last=False)
+        self.queues[self.ring.node_for(event['user'])].put((event, event_id))
+        return True
+
+
+class Supervisor:
+    """
+    Runs a campaign over several worker processes, so the CPU-bound work of the conversations
+    (normalization, prompt rendering, parsing) is not serialized by a single interpreter.
+    Professionals are assigned to workers by consistent hashing of their Slack user ID, and
+    the supervisor receives the Slack events and routes each one to the owning worker over
+    a local queue.
+    """
+
+    def __init__(self, workers, resolver=None, listen_events=None, worker=run_worker):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            resolver (SlackUserResolver): Resolver of the professionals' Slack IDs, defaults to a new one.
+            listen_events (bool): Receive replies through the Events API, defaults to Config.SLACK_INGESTION_MODE == 'events'.
+            worker (callable): Entry point of the worker processes, with the arguments of run_worker.
+        """
+        self.names = [f"worker-{i}" for i in range(workers)]
+        self.ring = HashRing(self.names)
+        self.resolver = resolver
+        self.listen_events = listen_events if listen_events is not None else Config.SLACK_INGESTION_MODE == 'events'
+        self.worker = worker
+
+    def assign(self, professionals):
+        """
+        Splits the professionals between the workers.
+
+        Returns:
+            dict: Roster records of every worker, by name.
+        """
+        if self.resolver is None:
+            from slack_integration import SlackUserResolver
+            self.resolver = SlackUserResolver()
+        # Resolved once here, the workers reload the directory from the resolver's cache file.
+        user_ids = self.resolver.resolve_many([p['EMAIL'].lower() for p in professionals])
+        shards = {name: [] for name in self.names}
+        for professional in professionals:
+            key = shard_key(professional, user_ids.get(professional['EMAIL'].lower()))
+            shards[self.ring.node_for(key)].append(professional)
+        return shards
+
+    def run(self, professionals):
+        """
+        Runs the campaign in the worker processes and waits for all of them.
+
+        Args:
+            professionals (list): Roster records of the professionals to contact.
+
+        Returns:
+            Counter: Number of conversations by final status.
+        """
+        shards = self.assign(professionals)
+        # Spawned rather than forked, the parent has HTTP pools and threads that must not be copied.
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        queues = {name: context.Queue() for name in self.names} if self.listen_events else {}
+        processes = []
+        for name in self.names:
+            if not shards[name]:
+                continue
+            print(f"{name}: {len(shards[name])} professionals")
+            process = context.Process(target=self.worker, name=name,
+                                      args=(name, shards[name], queues.get(name), results, len(self.names)))
+            process.start()
+            processes.append(process)
+
+        listener = None
+        if self.listen_events:
+            from slack_events import SlackEventListener
+            listener = SlackEventListener(ShardedEventRouter(self.ring, queues)).start()
+        statuses = Counter()
+        try:
+            pending = len(processes)
+            while pending:
+                try:
+                    statuses.update(status for _, status in results.get(timeout=1))
+                    pending -= 1
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes) and results.empty():
+                        # A worker died without reporting, its conversations are resumed by the next run.
+                        statuses['lost'] += pending
+                        break
+        finally:
+            if listener is not None:
+                listener.stop()
+            for events in queues.values():
+                events.put(None)
+            for process in processes:
+                process.join()
+        print("Campaign finished: " + ', '.join(f"{count} {status}" for status, count in statuses.items()))
+        return statuses
@@ -0,0 +1,78 @@
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain.retrievers import TimeWeightedVectorStoreRetriever
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import PrivateAttr
+
+
+class VectorizedTimeWeightedRetriever(TimeWeightedVectorStoreRetriever):
+    """
+    TimeWeightedVectorStoreRetriever scoring its candidates in one NumPy pass. The last access
+    time and the sum of the other score keys of every memory are kept in contiguous arrays
+    indexed like the memory stream, and the top k is selected with argpartition. Rankings,
+    including the order of ties, and the last access updates match the parent retriever.
+    The memory stream is left out of the retriever's repr, which is built on every retrieval.
+    """
+
+    _last_accessed: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0))
+    _other_scores: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0))
+    _size: int = PrivateAttr(default=0)
+
+    def __repr_args__(self):
+        # Retrievals serialize the retriever for their callbacks, and a repr of the whole memory
+        # stream costs more than the search itself once it holds thousands of memories.
+        return [(name, value) for name, value in super().__repr_args__() if name != 'memory_stream']
+
+    def _sync(self):
+        """Copies the scores of the memories added to the stream since the last retrieval into the arrays."""
+        if self._size > len(self.memory_stream):
+            # The memory stream was replaced, such as when an agent is restored.
+            self._size = 0
+        if self._size == len(self.memory_stream):
+            return
+        new_docs = self.memory_stream[self._size:]
+        size = len(self.memory_stream)
+        if size > len(self._last_accessed):
+            capacity = max(size, 2 * len(self._last_accessed), 64)
+            self._last_accessed = np.resize(self._last_accessed, capacity)
+            self._other_scores = np.resize(self._other_scores, capacity)
+        now = datetime.datetime.now()
+        self._last_accessed[self._size:size] = [self._document_get_date("last_accessed_at", doc).timestamp() if "last_accessed_at" in doc.metadata
+                                                else now.timestamp() for doc in new_docs]
+        self._other_scores[self._size:size] = [sum(doc.metadata[key] for key in self.other_score_keys if key in doc.metadata)
+                                               for doc in new_docs]
+        self._size = size
+
+    def _get_rescored_docs(self, docs_and_scores: Dict[Any, Tuple[Document, Optional[float]]]) -> List[Document]:
+        current_time = datetime.datetime.now()
+        self._sync()
+        if not docs_and_scores:
+            return []
+        # Candidates keep the insertion order of docs_and_scores, which breaks ties like the parent's stable sort.
+        candidates = np.fromiter((doc.metadata["buffer_idx"] for doc, _ in docs_and_scores.values()), dtype=np.int64,
+                                 count=len(docs_and_scores))
+        relevance = np.fromiter((0.0 if r is None else r for _, r in docs_and_scores.values()), dtype=np.float64,
+                                count=len(docs_and_scores))
+        hours_passed = (current_time.timestamp() - self._last_accessed[candidates]) / 3600
+        scores = (1.0 - self.decay_rate) ** hours_passed + self._other_scores[candidates] + relevance
+        top = self._top_k(scores)
+        result = []
+        # Ensure frequently accessed memories aren't forgotten
+        for buffer_idx in candidates[top].tolist():
+            buffered_doc = self.memory_stream[buffer_idx]
+            buffered_doc.metadata["last_accessed_at"] = current_time
+            result.append(buffered_doc)
+        self._last_accessed[candidates[top]] = current_time.timestamp()
+        return result
+
+    def _top_k(self, scores):
+        """Positions of the k best scores, best first, the earliest position first among equal scores."""
+        if len(scores) > self.k:
+            kth = scores[np.argpartition(scores, len(scores) - self.k)[len(scores) - self.k]]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)[:self.k - len(above)]
+            top = np.concatenate([above, tied])
+        else:
+            top = np.arange(len(scores))
+        return top[np.lexsort((top, -scores[top]))]
@@ -3,8 +3,10 @@ from langchain.embeddings import AzureOpenAIEmbeddings
 import faiss
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore import InMemoryDocstore
-from langchain.retrievers import TimeWeightedVectorStoreRetriever
 from config import Config
+from embedding_cache import with_embedding_cache
+from instrumentation import InstrumentedEmbeddings
+from time_weighted_retriever import VectorizedTimeWeightedRetriever
 import os
 
 def relevance_score_fn(score: float) -> float:
@@ -20,15 +22,29 @@ def relevance_score_fn(score: float) -> float:
     """Calculate relevance score for vector embeddings."""
     return 1.0 - score / math.sqrt(2)
 
+def create_embeddings_model():
+    """
+    Creates the Azure OpenAI embeddings model used by the memory retrievers and the memory store,
+    answering texts it has already embedded from the embedding cache. The requests sent to the
+    deployment, cache misses only, are recorded as instrumentation spans.
+
+    Returns:
+        Embeddings: Embeddings model of the configured deployment.
+    """
+    deployment = os.environ["AZURE_EMBEDDING_DEPLOYMENT_NAME"]
+    embeddings_model = AzureOpenAIEmbeddings(azure_deployment = deployment, openai_api_version = os.environ["AZURE_OPENAI_API_VERSION"])
+    embeddings_model = InstrumentedEmbeddings(embeddings_model, name=deployment)
+    return with_embedding_cache(embeddings_model, namespace=f"{deployment}/{Config.EMBEDDINGS_SIZE}")
+
 def create_new_memory_retriever():
     """
     Creates and configures a new memory retriever using Azure OpenAI embeddings with a FAISS vector store.
     
     Returns:
-        TimeWeightedVectorStoreRetriever: Configured retriever ready for use with embedded data.
+        VectorizedTimeWeightedRetriever: Configured retriever ready for use with embedded data.
     """
-    embeddings_model = AzureOpenAIEmbeddings(azure_deployment = os.environ["AZURE_EMBEDDING_DEPLOYMENT_NAME"], openai_api_version = os.environ["AZURE_OPENAI_API_VERSION"])
-    embeddings_size =  1536
+    embeddings_model = create_embeddings_model()
+    embeddings_size = Config.EMBEDDINGS_SIZE
     index = faiss.IndexFlatL2(embeddings_size)
     vectorstore = FAISS(embeddings_model, index, InMemoryDocstore({}), {}, relevance_score_fn=relevance_score_fn)
-    return TimeWeightedVectorStoreRetriever(vectorstore=vectorstore, other_score_keys=["importance"], k=15) 
\ No newline at end of file
+    return VectorizedTimeWeightedRetriever(vectorstore=vectorstore, other_score_keys=["importance"], k=15) 
\ No newline at end of file